@@ -2,16 +2,20 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import csv
+import io
 import json
 import logging
 import sys
 from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
 from logging import FileHandler, Formatter
 
-import babel
+import babel.dates
 import dateutil.parser
-from flask import (Flask, Response, flash, redirect, render_template, request,
-                   url_for)
+from flask import (Flask, Response, abort, flash, jsonify, redirect,
+                   render_template, request, url_for)
 from flask_migrate import Migrate
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
@@ -19,6 +23,9 @@ from flask_wtf import Form, CsrfProtect
 from wtforms.validators import (ValidationError)
 from models import *
 from forms import *
+from search import search_backend
+from cache import PageCache
+from export import export_response
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -31,22 +38,127 @@ db.init_app(app)
 
 migrate = Migrate(app, db)
 csrf = CsrfProtect(app)
+cache = PageCache(app)
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+# One compiled pattern and locale per (format, locale) pair.
+@lru_cache(maxsize=None)
+def datetime_formatter(format, locale):
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, babel.Locale.parse(locale)
+
+
+# Listing pages format the same start times over and over.
+@lru_cache(maxsize=4096)
+def cached_format_datetime(value, format, locale):
+    pattern, locale = datetime_formatter(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=babel.dates.LC_TIME):
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return cached_format_datetime(value, format, str(locale))
 
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+
+# Rows must already be ordered by (state, city) so each area is one run.
+def group_by_area(rows):
+    areas = []
+    for (state, city), venues in groupby(rows, key=lambda v: (v.state, v.city)):
+        areas.append({
+            "city": city,
+            "state": state,
+            "venues": [{
+                'id': v.id,
+                'name': v.name
+            } for v in venues]
+        })
+    return areas
+
+
+# Counts upcoming shows with one grouped query and only returns a single
+# page of ranked matches, so short search terms cannot load every row and
+# its shows.
+def search_with_upcoming_shows(model, show_fk, search_term):
+    limit = min(
+        max(request.form.get('limit', app.config['SEARCH_RESULTS_LIMIT'],
+                             type=int), 1), app.config['SEARCH_RESULTS_LIMIT'])
+    offset = max(request.form.get('offset', 0, type=int), 0)
+    matches = search_backend().matches(model, search_term).alias('matches')
+
+    rows = db.session.query(
+        model.id, model.name,
+        db.func.count(Show.id).label('num_upcoming_shows')).join(
+            matches, matches.c.id == model.id).outerjoin(
+                Show,
+                db.and_(show_fk == model.id,
+                        Show.start_time >= datetime.utcnow())).group_by(
+                            model.id, model.name, matches.c.rank).order_by(
+                                matches.c.rank, model.name,
+                                model.id).offset(offset).limit(limit).all()
+    count = db.session.query(db.func.count()).select_from(matches).scalar()
+
+    return {
+        "count": count,
+        "data": [row._asdict() for row in rows],
+        "offset": offset,
+        "next_offset": offset + limit if offset + limit < count else None
+    }
+
+
+# Partitions already-loaded shows into (past, upcoming) against a single
+# "now", formatting each show with the given callable.
+def split_shows(shows, format_show):
+    now = datetime.now()
+    past, upcoming = [], []
+    for show in shows:
+        (upcoming if show.start_time >= now else past).append(format_show(show))
+    return past, upcoming
+
+
+# Plain-data copy of a venue/artist for the detail templates, so the page
+# can be cached and shared between requests.
+def detail_page(entity, shows, format_show):
+    data = {c.name: getattr(entity, c.name) for c in entity.__table__.columns}
+    data['genres'] = entity.genre_names
+    data['past_shows'], data['upcoming_shows'] = split_shows(shows, format_show)
+    data['past_shows_count'] = len(data['past_shows'])
+    data['upcoming_shows_count'] = len(data['upcoming_shows'])
+    return data
+
+
+# Cache tags touched by a write to a venue/artist: its listing, its own page
+# and the pages of everyone it shares a show with (they render its name).
+def venue_cache_tags(venue_id):
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).distinct().all()
+    return ['venues', f'venue:{venue_id}'
+           ] + [f'artist:{artist_id}' for (artist_id,) in artist_ids]
+
+
+def artist_cache_tags(artist_id):
+    venue_ids = db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).distinct().all()
+    return ['artists', f'artist:{artist_id}'
+           ] + [f'venue:{venue_id}' for (venue_id,) in venue_ids]
+
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -63,43 +175,30 @@ def index():
 
 @app.route('/venues')
 def venues():
-    areas = list(set(Venue.query.with_entities(Venue.city, Venue.state).all()))
-    data = []
-    for area in areas:
-        venues = Venue.query.filter_by(city=area[0]).all()
-        data.append({
-            "city": area[0],
-            "state": area[1],
-            "venues": [{
-                'id': v.id,
-                'name': v.name
-            } for v in venues]
-        })
+    return render_template('pages/venues.html',
+                           areas=venue_areas(request.args.get('genre')))
+
 
-    return render_template('pages/venues.html', areas=data)
+@cache.memoize('venues')
+def venue_areas(genre):
+    query = Venue.query.with_entities(Venue.id, Venue.name, Venue.city,
+                                      Venue.state)
+    if genre:
+        query = query.join(Venue.genres).filter(Genre.name == genre)
+    rows = query.order_by(Venue.state, Venue.city, Venue.id).all()
+    return group_by_area(rows)
+
+
+# Streams every venue as NDJSON, or CSV with ?format=csv.
+@app.route('/venues/export')
+def export_venues():
+    return export_response('venues', request.args.get('format', 'ndjson'))
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-    search = request.form.get('search_term', '')
-    query = Venue.query.filter(Venue.name.ilike(f"%{search}%")).all()
-
-    response = {
-        "count":
-            len(query),
-        "data": [{
-            "id":
-                venue.id,
-            "name":
-                venue.name,
-            "num_upcoming_shows":
-                len(
-                    list(
-                        filter(
-                            lambda show: show.start_time >= datetime.utcnow(),
-                            venue.shows)))
-        } for venue in query]
-    }
+    response = search_with_upcoming_shows(Venue, Show.venue_id,
+                                          request.form.get('search_term', ''))
     return render_template('pages/search_venues.html',
                            results=response,
                            search_term=request.form.get('search_term', ''))
@@ -107,34 +206,27 @@ def search_venues():
 
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
-    venue = Venue.query.get(venue_id)
-    data = venue
-    data.genres = data.genres.split(',')
-
-    past_shows = db.session.query(Show).join(Venue).filter(
-        Show.venue_id == venue_id).filter(
-            Show.start_time < datetime.now()).all()
-    upcoming_shows = db.session.query(Show).join(Venue).filter(
-        Show.venue_id == venue_id).filter(
-            Show.start_time >= datetime.now()).all()
-
-    data.upcoming_shows = [{
-        "artist_id": show.artist_id,
-        "artist_name": show.artist.name,
-        "artist_image_link": show.artist.image_link,
-        "start_time": str(show.start_time)
-    } for show in upcoming_shows]
+    data = venue_page(venue_id)
+    if data is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=data)
 
-    data.past_shows = [{
-        "artist_id": show.artist_id,
-        "artist_name": show.artist.name,
-        "artist_image_link": show.artist.image_link,
-        "start_time": str(show.start_time)
-    } for show in past_shows]
 
-    data.past_shows_count = len(past_shows)
-    data.upcoming_shows_count = len(upcoming_shows)
-    return render_template('pages/show_venue.html', venue=data)
+@cache.memoize(lambda venue_id: f'venue:{venue_id}')
+def venue_page(venue_id):
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return None
+    shows = Show.query.options(db.joinedload(Show.artist)).filter(
+        Show.venue_id == venue_id).order_by(Show.start_time).all()
+
+    return detail_page(
+        venue, shows, lambda show: {
+            "artist_id": show.artist_id,
+            "artist_name": show.artist.name,
+            "artist_image_link": show.artist.image_link,
+            "start_time": show.start_time
+        })
 
 
 #  Create Venue
@@ -162,7 +254,7 @@ def create_venue_submission():
             phone=request.form['phone'],
             image_link=request.form['image_link'],
             website=request.form['website'],
-            genres=','.join(request.form.getlist('genres')),
+            genres=genres_from_names(request.form.getlist('genres')),
             facebook_link=request.form['facebook_link'],
             seeking_talent=True
             if request.form.get('seeking_talent', None) == 'y' else False,
@@ -170,6 +262,7 @@ def create_venue_submission():
         )
         db.session.add(venue)
         db.session.commit()
+        cache.invalidate('venues')
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except:
         print(sys.exc_info())
@@ -188,8 +281,10 @@ def delete_venue(venue_id):
     try:
         venue = Venue.query.get(venue_id)
         name = venue.name
+        tags = venue_cache_tags(venue.id)
         db.session.delete(venue)
         db.session.commit()
+        cache.invalidate(*tags)
         flash('Venue ' + name + ' was successfully deleted!')
     except:
         print(sys.exc_info())
@@ -204,33 +299,32 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    artists = Artist.query.all()
+    return render_template('pages/artists.html',
+                           artists=artist_list(request.args.get('genre')))
+
+
+@cache.memoize('artists')
+def artist_list(genre):
+    query = Artist.query.with_entities(Artist.id, Artist.name)
+    if genre:
+        query = query.join(Artist.genres).filter(Genre.name == genre)
+    artists = query.order_by(Artist.id).all()
     data = []
     for artist in artists:
         data.append({"id": artist.id, "name": artist.name})
-    return render_template('pages/artists.html', artists=data)
+    return data
+
+
+# Streams every artist as NDJSON, or CSV with ?format=csv.
+@app.route('/artists/export')
+def export_artists():
+    return export_response('artists', request.args.get('format', 'ndjson'))
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    search = request.form.get('search_term', '')
-    query = Artist.query.filter(Artist.name.ilike(f"%{search}%")).all()
-    response = {
-        "count":
-            len(query),
-        "data": [{
-            "id":
-                artist.id,
-            "name":
-                artist.name,
-            "num_upcoming_shows":
-                len(
-                    list(
-                        filter(
-                            lambda show: show.start_time >= datetime.utcnow(),
-                            artist.shows)))
-        } for artist in query]
-    }
+    response = search_with_upcoming_shows(Artist, Show.artist_id,
+                                          request.form.get('search_term', ''))
     return render_template('pages/search_artists.html',
                            results=response,
                            search_term=request.form.get('search_term', ''))
@@ -238,34 +332,27 @@ def search_artists():
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
-    data = artist
-    data.genres = data.genres.split(',')
-
-    past_shows = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist_id).filter(
-            Show.start_time < datetime.now()).all()
-    upcoming_shows = db.session.query(Show).join(Venue).filter(
-        Show.artist_id == artist_id).filter(
-            Show.start_time >= datetime.now()).all()
-
-    data.upcoming_shows = [{
-        "venue_id": show.venue_id,
-        "venue_name": show.venue.name,
-        "venue_image_link": show.venue.image_link,
-        "start_time": str(show.start_time)
-    } for show in upcoming_shows]
+    data = artist_page(artist_id)
+    if data is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=data)
 
-    data.past_shows = [{
-        "venue_id": show.venue_id,
-        "venue_name": show.venue.name,
-        "venue_image_link": show.venue.image_link,
-        "start_time": str(show.start_time)
-    } for show in past_shows]
 
-    data.past_shows_count = len(past_shows)
-    data.upcoming_shows_count = len(upcoming_shows)
-    return render_template('pages/show_artist.html', artist=data)
+@cache.memoize(lambda artist_id: f'artist:{artist_id}')
+def artist_page(artist_id):
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return None
+    shows = Show.query.options(db.joinedload(Show.venue)).filter(
+        Show.artist_id == artist_id).order_by(Show.start_time).all()
+
+    return detail_page(
+        artist, shows, lambda show: {
+            "venue_id": show.venue_id,
+            "venue_name": show.venue.name,
+            "venue_image_link": show.venue.image_link,
+            "start_time": show.start_time
+        })
 
 
 #  Update
@@ -273,8 +360,7 @@ def show_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     artist = Artist.query.get(artist_id)
-    artist.genres = artist.genres.split(',')
-    form = ArtistForm(data=artist.__dict__)
+    form = ArtistForm(data=dict(artist.__dict__, genres=artist.genre_names))
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
@@ -287,10 +373,13 @@ def edit_artist_submission(artist_id):
             raise ValidationError()
         artist = Artist.query.get(artist_id)
         form = ArtistForm(obj=artist)
+        genres = form.genres.data
+        del form.genres
         form.populate_obj(artist)
-        artist.genres = ','.join(artist.genres)
+        artist.genres = genres_from_names(genres)
         db.session.add(artist)
         db.session.commit()
+        cache.invalidate(*artist_cache_tags(artist_id))
     except:
         print(sys.exc_info())
         db.session.rollback()
@@ -303,8 +392,7 @@ def edit_artist_submission(artist_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     venue = Venue.query.get(venue_id)
-    venue.genres = venue.genres.split(',')
-    form = VenueForm(data=venue.__dict__)
+    form = VenueForm(data=dict(venue.__dict__, genres=venue.genre_names))
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
@@ -318,10 +406,13 @@ def edit_venue_submission(venue_id):
             raise ValidationError()
         venue = Venue.query.get(venue_id)
         form = VenueForm(obj=venue)
+        genres = form.genres.data
+        del form.genres
         form.populate_obj(venue)
-        venue.genres = ','.join(venue.genres)
+        venue.genres = genres_from_names(genres)
         db.session.add(venue)
         db.session.commit()
+        cache.invalidate(*venue_cache_tags(venue_id))
     except:
         print(sys.exc_info())
         db.session.rollback()
@@ -356,7 +447,7 @@ def create_artist_submission():
             phone=request.form['phone'],
             image_link=request.form['image_link'],
             website=request.form['website'],
-            genres=','.join(request.form.getlist('genres')),
+            genres=genres_from_names(request.form.getlist('genres')),
             facebook_link=request.form['facebook_link'],
             seeking_venue=True
             if request.form.get('seeking_venue', None) == 'y' else False,
@@ -364,6 +455,7 @@ def create_artist_submission():
         )
         db.session.add(artist)
         db.session.commit()
+        cache.invalidate('artists')
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except:
         print(sys.exc_info())
@@ -382,16 +474,62 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-    shows = Show.query.all()
+    per_page = min(
+        max(request.args.get('per_page', app.config['SHOWS_PER_PAGE'],
+                             type=int), 1), app.config['SHOWS_MAX_PER_PAGE'])
+    after_time = request.args.get('after_time', None)
+    after_id = request.args.get('after_id', None, type=int)
+    if after_time and after_id is not None:
+        try:
+            after_time = dateutil.parser.parse(after_time)
+        except (ValueError, OverflowError):
+            abort(400)
+    else:
+        after_time = after_id = None
+
+    data, last = shows_page(per_page, after_time, after_id)
+    next_url = None
+    if last is not None:
+        next_url = url_for('shows',
+                           after_time=last['start_time'].isoformat(),
+                           after_id=last['id'],
+                           per_page=per_page)
+    return render_template('pages/shows.html', shows=data, next_url=next_url)
+
+
+# Returns one page of shows and the last row when another page follows.
+@cache.memoize('shows', 'venues', 'artists')
+def shows_page(per_page, after_time, after_id):
+    query = db.session.query(
+        Show.id, Show.start_time, Show.venue_id,
+        Venue.name.label('venue_name'), Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')).join(
+            Venue, Show.venue_id == Venue.id).join(
+                Artist, Show.artist_id == Artist.id)
+    if after_time is not None:
+        query = query.filter(
+            db.tuple_(Show.start_time, Show.id) > db.tuple_(
+                after_time, after_id))
+    # One extra row tells us whether a next page exists.
+    rows = query.order_by(Show.start_time, Show.id).limit(per_page + 1).all()
+
     data = [{
+        "id": show.id,
         "venue_id": show.venue_id,
-        "venue_name": show.venue.name,
+        "venue_name": show.venue_name,
         "artist_id": show.artist_id,
-        "artist_name": show.artist.name,
-        "artist_image_link": show.artist.image_link,
-        "start_time": str(show.start_time),
-    } for show in shows]
-    return render_template('pages/shows.html', shows=data)
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time,
+    } for show in rows[:per_page]]
+    return data, data[-1] if len(rows) > per_page else None
+
+
+# Streams every show as NDJSON, or CSV with ?format=csv.
+@app.route('/shows/export')
+def export_shows():
+    return export_response('shows', request.args.get('format', 'ndjson'))
 
 
 @app.route('/shows/create')
@@ -416,6 +554,8 @@ def create_show_submission():
         )
         db.session.add(show)
         db.session.commit()
+        cache.invalidate('shows', f'venue:{show.venue_id}',
+                         f'artist:{show.artist_id}')
         flash('Show was successfully listed!')
     except:
         print(sys.exc_info())
@@ -427,6 +567,98 @@ def create_show_submission():
     return redirect(url_for('index'))
 
 
+# Reads the body of POST /shows/bulk: a JSON array of objects, or CSV with an
+# artist_id,venue_id,start_time header. Returns None for anything else.
+def bulk_show_records():
+    if request.mimetype == 'application/json':
+        records = request.get_json(silent=True)
+        return records if isinstance(records, list) else None
+    if request.mimetype == 'text/csv':
+        body = request.get_data(as_text=True)
+        try:
+            return list(csv.DictReader(io.StringIO(body)))
+        except csv.Error:
+            return None
+    return None
+
+
+# Returns the rows to insert and a list of {'row', 'errors'} for the records
+# that are malformed or name an artist or venue that does not exist. Ids are
+# checked with one IN query per table for the whole batch.
+def validate_show_records(records):
+    parsed = []
+    for number, record in enumerate(records, 1):
+        row, errors = {}, []
+        if not isinstance(record, dict):
+            parsed.append((number, row, ['expected an object']))
+            continue
+        for key in ('artist_id', 'venue_id'):
+            try:
+                row[key] = int(record.get(key))
+            except (TypeError, ValueError):
+                errors.append(f'{key} must be an integer')
+        try:
+            row['start_time'] = dateutil.parser.parse(record['start_time'])
+        except (KeyError, TypeError, ValueError, OverflowError):
+            errors.append('start_time must be a date and time')
+        parsed.append((number, row, errors))
+
+    artist_ids = {row['artist_id'] for _, row, _ in parsed
+                  if 'artist_id' in row}
+    venue_ids = {row['venue_id'] for _, row, _ in parsed if 'venue_id' in row}
+    known_artists = {id for (id,) in db.session.query(Artist.id).filter(
+        Artist.id.in_(artist_ids))} if artist_ids else set()
+    known_venues = {id for (id,) in db.session.query(Venue.id).filter(
+        Venue.id.in_(venue_ids))} if venue_ids else set()
+
+    rows, failures = [], []
+    for number, row, errors in parsed:
+        if 'artist_id' in row and row['artist_id'] not in known_artists:
+            errors.append(f'artist {row["artist_id"]} does not exist')
+        if 'venue_id' in row and row['venue_id'] not in known_venues:
+            errors.append(f'venue {row["venue_id"]} does not exist')
+        if errors:
+            failures.append({'row': number, 'errors': errors})
+        else:
+            rows.append(row)
+    return rows, failures
+
+
+# Lists a whole tour in one request: either every show is inserted in a
+# single transaction, or none is and the response lists each bad row.
+@app.route('/shows/bulk', methods=['POST'])
+@csrf.exempt
+def create_shows_bulk():
+    # Exempt from CSRF because only JSON and text/csv bodies are accepted,
+    # which a cross-site form cannot send.
+    if (request.content_length or 0) > app.config['BULK_SHOWS_MAX_BYTES']:
+        abort(413)
+    records = bulk_show_records()
+    if records is None:
+        abort(400)
+    if len(records) > app.config['BULK_SHOWS_LIMIT']:
+        abort(413)
+
+    rows, failures = validate_show_records(records)
+    if failures:
+        return jsonify({'success': False, 'errors': failures}), 422
+
+    try:
+        if rows:
+            db.session.execute(Show.__table__.insert(), rows)
+        db.session.commit()
+    except:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(500)
+    finally:
+        db.session.close()
+
+    cache.invalidate('shows', *[f'venue:{row["venue_id"]}' for row in rows],
+                     *[f'artist:{row["artist_id"]}' for row in rows])
+    return jsonify({'success': True, 'created': len(rows)}), 201
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
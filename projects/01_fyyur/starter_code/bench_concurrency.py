@@ -0,0 +1,124 @@
+#----------------------------------------------------------------------------#
+# Drives the app from many threads against a scratch SQLite database,
+# mixing listing/detail page reads with artist submissions, and prints
+# throughput, latency percentiles and how many submissions were lost.
+# Failed writes are rolled back and flashed, so they are counted from the
+# rows that actually landed rather than from status codes.
+#
+#   python bench_concurrency.py --threads 32 --requests 4000
+#   python bench_concurrency.py --legacy    # without WAL and busy_timeout
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DATABASE_PATH = os.path.join(tempfile.gettempdir(), 'fyyur_concurrency.db')
+# config.py reads this when app is imported below.
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE_PATH
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import engine
+from app import app
+from models import Artist, Genre, Venue, db
+
+GENRES = ['Jazz', 'Blues', 'Folk']
+READ_PATHS = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1']
+
+
+def seed(venues, artists):
+    db.drop_all()
+    db.create_all()
+    genres = [Genre(name=name) for name in GENRES]
+    db.session.add_all(genres)
+    db.session.add_all([
+        Venue(name=f'Venue {i}', city=f'City {i % 20}', state='CA',
+              address=f'{i} Main St', phone=f'v-{i}', genres=genres[:2],
+              image_link='https://example.com/venue.png')
+        for i in range(venues)
+    ] + [
+        Artist(name=f'Artist {i}', city=f'City {i % 20}', state='NY',
+               phone=f'a-{i}', genres=genres[1:],
+               image_link='https://example.com/artist.png')
+        for i in range(artists)
+    ])
+    db.session.commit()
+
+
+def artist_form(i):
+    return {
+        'name': f'Touring artist {i}',
+        'city': 'San Francisco',
+        'state': 'CA',
+        'phone': f'415-{i // 10000:03d}-{i % 10000:04d}',
+        'image_link': 'https://example.com/artist.png',
+        'website': 'https://example.com',
+        'facebook_link': 'https://facebook.com/example',
+        'genres': GENRES[i % len(GENRES)],
+        'seeking_description': '',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load Fyyur from many threads at once.')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--legacy', action='store_true',
+                        help='skip the SQLite pragmas from engine.py')
+    args = parser.parse_args()
+
+    if args.legacy:
+        event.remove(Engine, 'connect', engine.set_sqlite_pragmas)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        seed(100, 100)
+        artists_before = Artist.query.count()
+
+    def worker(ids):
+        client = app.test_client()
+        timings, writes = [], 0
+        for i in ids:
+            started = time.perf_counter()
+            if random.random() < args.write_ratio:
+                client.post('/artists/create', data=artist_form(i))
+                writes += 1
+            else:
+                client.get(random.choice(READ_PATHS))
+            timings.append(time.perf_counter() - started)
+        return timings, writes
+
+    chunks = [range(n, args.requests, args.threads)
+              for n in range(args.threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        landed = Artist.query.count() - artists_before
+        db.session.remove()
+    for leftover in ('', '-wal', '-shm'):
+        if os.path.exists(DATABASE_PATH + leftover):
+            os.unlink(DATABASE_PATH + leftover)
+
+    timings = sorted(t for chunk, _ in results for t in chunk)
+    writes = sum(w for _, w in results)
+    print(f'{"legacy" if args.legacy else "tuned"}: {args.requests} '
+          f'requests, {args.threads} threads, {writes} artist submissions')
+    print(f'throughput {len(timings) / elapsed:10.0f} req/s')
+    for label, q in (('p50', 0.5), ('p99', 0.99), ('max', 1.0)):
+        value = timings[min(int(q * len(timings)), len(timings) - 1)]
+        print(f'{label:<11}{value * 1000:10.1f} ms')
+    print(f'lost writes{writes - landed:10d}')
+
+
+if __name__ == '__main__':
+    main()
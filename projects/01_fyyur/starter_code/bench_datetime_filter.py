@@ -0,0 +1,77 @@
+#----------------------------------------------------------------------------#
+# Renders pages/shows.html with many rows using the original datetime filter
+# (str -> dateutil parse -> babel pattern rebuilt per call) and the cached
+# one from app.py, and prints the render times. No database is needed.
+#
+#   python bench_datetime_filter.py --rows 10000
+#----------------------------------------------------------------------------#
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from flask import render_template
+
+from app import app, cached_format_datetime, format_datetime
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def make_shows(rows, distinct_times, as_string):
+    start = datetime(2020, 1, 1, 20, 0)
+    shows = []
+    for i in range(rows):
+        start_time = start + timedelta(hours=i % distinct_times)
+        shows.append({
+            "venue_id": i,
+            "venue_name": f"Venue {i}",
+            "artist_id": i,
+            "artist_name": f"Artist {i}",
+            "artist_image_link": "https://example.com/artist.png",
+            "start_time": str(start_time) if as_string else start_time,
+        })
+    return shows
+
+
+def render(filter, shows):
+    # Compiled templates bind their filters, so drop them on every swap.
+    app.jinja_env.filters['datetime'] = filter
+    app.jinja_env.cache.clear()
+    with app.test_request_context('/shows'):
+        render_template('pages/shows.html', shows=shows[:1], next_url=None)
+        started = time.perf_counter()
+        render_template('pages/shows.html', shows=shows, next_url=None)
+        return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time shows.html with the old and new datetime filter.')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--distinct-times', type=int, default=2000)
+    args = parser.parse_args()
+
+    legacy = render(legacy_format_datetime,
+                    make_shows(args.rows, args.distinct_times, True))
+    shows = make_shows(args.rows, args.distinct_times, False)
+    cached_format_datetime.cache_clear()
+    cold = render(format_datetime, shows)
+    warm = render(format_datetime, shows)
+
+    print(f'rows: {args.rows}, distinct start times: {args.distinct_times}')
+    print(f'legacy filter          {legacy:10.1f} ms')
+    print(f'cached filter (cold)   {cold:10.1f} ms  {legacy / cold:6.1f}x')
+    print(f'cached filter (warm)   {warm:10.1f} ms  {legacy / warm:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
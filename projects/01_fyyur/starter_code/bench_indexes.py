@@ -0,0 +1,163 @@
+#----------------------------------------------------------------------------#
+# Seeds a scratch database with many venues, artists and shows, then times
+# Fyyur's hot queries and prints their plans with and without the Show and
+# Venue indexes declared in models.py.
+#
+#   python bench_indexes.py
+#   python bench_indexes.py --database-url postgres://localhost:5432/fyyur_bench
+#
+# The target database is dropped and recreated, never point it at real data.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from models import Artist, Show, Venue, db
+
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.join(tempfile.gettempdir(),
+                                                  'fyyur_bench.db')
+CHUNK_SIZE = 5000
+
+
+def seed(engine, venues, artists, shows):
+    random.seed(42)
+    states = ['CA', 'NY', 'TX', 'WA', 'OR', 'IL', 'FL', 'MA']
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(Venue.__table__.insert(), [{
+            'id': i,
+            'name': f'Venue {i}',
+            'city': f'City {i % 500}',
+            'state': random.choice(states),
+            'address': f'{i} Main St',
+            'phone': f'v-{i}',
+            'image_link': 'https://example.com/venue.png'
+        } for i in range(1, venues + 1)])
+        conn.execute(Artist.__table__.insert(), [{
+            'id': i,
+            'name': f'Artist {i}',
+            'city': f'City {i % 500}',
+            'state': random.choice(states),
+            'phone': f'a-{i}',
+            'image_link': 'https://example.com/artist.png'
+        } for i in range(1, artists + 1)])
+        for start in range(1, shows + 1, CHUNK_SIZE):
+            conn.execute(Show.__table__.insert(), [{
+                'id': i,
+                'venue_id': random.randint(1, venues),
+                'artist_id': random.randint(1, artists),
+                'start_time': now + timedelta(hours=random.randint(-50000, 50000))
+            } for i in range(start, min(start + CHUNK_SIZE, shows + 1))])
+
+
+def hot_queries(venues, artists):
+    show = Show.__table__
+    venue = Venue.__table__
+    now = datetime.now()
+    return {
+        'show_venue':
+            sa.select([show]).where(show.c.venue_id == venues // 2).order_by(
+                show.c.start_time),
+        'show_artist':
+            sa.select([show]).where(show.c.artist_id == artists // 2).order_by(
+                show.c.start_time),
+        'upcoming_count':
+            sa.select([sa.func.count(show.c.id)]).where(
+                sa.and_(show.c.venue_id == venues // 3,
+                        show.c.start_time >= now)),
+        'venues_by_area':
+            sa.select([venue.c.id, venue.c.name, venue.c.city,
+                       venue.c.state]).order_by(venue.c.state, venue.c.city,
+                                                venue.c.id),
+        'shows_page':
+            sa.select([show]).where(
+                sa.tuple_(show.c.start_time, show.c.id) > sa.tuple_(now, 0)
+            ).order_by(show.c.start_time, show.c.id).limit(31),
+    }
+
+
+def explain(engine, stmt):
+    prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    compiled = stmt.compile(dialect=engine.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    with engine.connect() as conn:
+        rows = conn.execute(prefix + str(compiled), params).fetchall()
+    return [' '.join(str(col) for col in row) for row in rows]
+
+
+def measure(engine, queries, repeat):
+    timings = {}
+    with engine.connect() as conn:
+        for name, stmt in queries.items():
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                conn.execute(stmt).fetchall()
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[name] = statistics.median(samples)
+    return timings
+
+
+def analyze(engine):
+    with engine.begin() as conn:
+        conn.execute('ANALYZE')
+
+
+def report(title, engine, queries, repeat):
+    print(f'== {title}')
+    for name, stmt in queries.items():
+        print(f'-- {name}')
+        for line in explain(engine, stmt):
+            print(f'   {line}')
+    return measure(engine, queries, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time Fyyur queries with and without indexes.')
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--venues', type=int, default=5000)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--shows', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.database_url)
+    indexes = list(Show.__table__.indexes) + list(Venue.__table__.indexes)
+
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    for index in indexes:
+        index.drop(engine)
+
+    started = time.perf_counter()
+    seed(engine, args.venues, args.artists, args.shows)
+    print(f'Seeded {args.venues} venues, {args.artists} artists and '
+          f'{args.shows} shows in {time.perf_counter() - started:.1f}s')
+
+    queries = hot_queries(args.venues, args.artists)
+    analyze(engine)
+    before = report('without indexes', engine, queries, args.repeat)
+
+    for index in indexes:
+        index.create(engine)
+    analyze(engine)
+    after = report('with indexes', engine, queries, args.repeat)
+
+    print(f'{"query":<16}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+    for name in queries:
+        print(f'{name:<16}{before[name]:>12.2f}{after[name]:>12.2f}'
+              f'{before[name] / max(after[name], 1e-6):>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#----------------------------------------------------------------------------#
+# Read-page cache.
+#
+# Views cache the data they render rather than the final HTML, because the
+# layout embeds a per-session CSRF token and flashed messages. Every entry
+# is tagged (e.g. 'venues', 'venue:3') and its key embeds the current
+# version of each tag, so bumping a tag after a write makes every entry that
+# depends on it unreachable at once, in any store.
+#----------------------------------------------------------------------------#
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+
+class MemoryStore:
+    # In-process store with per-entry TTL and LRU eviction past max_entries.
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # Tag versions live outside the LRU so they are never evicted.
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisStore:
+    # Shared store for multi-process deployments. Takes any client exposing
+    # redis-py's get/set(ex=)/incr, e.g. redis.Redis.from_url(...), and
+    # relies on the server's maxmemory policy for size-bounded eviction.
+
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=timeout)
+
+    def get_counter(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+
+class PageCache:
+
+    def __init__(self, app=None):
+        self.store = None
+        self.default_timeout = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        self.store = app.config.get('CACHE_STORE') or MemoryStore(
+            app.config.get('CACHE_MAX_ENTRIES', 1024))
+
+    def key_for(self, name, args, tags):
+        versions = ','.join(
+            f'{tag}@{self.store.get_counter("tag:" + tag)}' for tag in tags)
+        return f'{name}{args!r}[{versions}]'
+
+    # Caches a function's return value under the given tags. Tags may be
+    # callables taking the function's arguments, e.g. lambda id: f'venue:{id}'.
+    def memoize(self, *tags, timeout=None):
+
+        def decorator(f):
+
+            @wraps(f)
+            def wrapper(*args):
+                resolved = [tag(*args) if callable(tag) else tag for tag in tags]
+                key = self.key_for(f.__name__, args, resolved)
+                value = self.store.get(key)
+                if value is None:
+                    value = f(*args)
+                    self.store.set(key, value, timeout or self.default_timeout)
+                return value
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, *tags):
+        for tag in set(tags):
+            self.store.incr('tag:' + tag)
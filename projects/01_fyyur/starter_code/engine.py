@@ -0,0 +1,61 @@
+#----------------------------------------------------------------------------#
+# Engine configuration.
+#
+# Builds SQLALCHEMY_ENGINE_OPTIONS for config.py. Server databases get a
+# sized, pre-pinged and recycled pool plus a Postgres statement timeout;
+# SQLite files are opened per checkout, so they get WAL mode and a busy
+# timeout instead. Every knob can be overridden from the environment.
+#
+# The trivia, coffee shop and capstone apps carry copies of this module,
+# since each project is deployed on its own; this one documents why each
+# setting is there. Change the copies along with it.
+#----------------------------------------------------------------------------#
+
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+# Seconds to wait for a free connection / before replacing one.
+POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+# Milliseconds.
+STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 30000))
+
+
+def engine_options(database_uri):
+    if database_uri.startswith('sqlite'):
+        return {}
+
+    options = {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+    if database_uri.startswith('postgres'):
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={STATEMENT_TIMEOUT}'}
+    if make_url(database_uri).get_driver_name() == 'psycopg2':
+        # Send executemany inserts as multi-row VALUES, not a row at a time.
+        options['executemany_mode'] = 'values'
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    # WAL lets readers carry on while a write commits; busy_timeout makes a
+    # blocked writer wait for the lock instead of raising "database is locked".
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
@@ -0,0 +1,108 @@
+#----------------------------------------------------------------------------#
+# Streaming NDJSON / CSV export.
+#
+# Rows are read through a server-side cursor (yield_per turns on
+# stream_results) and encoded as they arrive, so a response starts at once
+# and memory stays flat however large the table is. Venue and artist genres
+# are looked up with one IN query per batch of rows, not one per row.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+from flask import Response, abort, stream_with_context
+
+from models import Artist, Genre, Show, Venue, artist_genres, db, venue_genres
+
+EXPORT_BATCH_SIZE = 1000
+# Encoded rows are flushed to the client in chunks of about this many bytes.
+CHUNK_SIZE = 64 * 1024
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def entity_records(model, association, key):
+    columns = list(model.__table__.columns)
+    rows = db.session.query(*columns).order_by(model.id).yield_per(
+        EXPORT_BATCH_SIZE)
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, EXPORT_BATCH_SIZE))
+        if not batch:
+            return
+        genres = {}
+        for entity_id, name in db.session.query(
+                association.c[key], Genre.name).join(
+                    Genre, Genre.id == association.c.genre_id).filter(
+                        association.c[key].in_([row.id for row in batch
+                                                ])).order_by(Genre.name):
+            genres.setdefault(entity_id, []).append(name)
+        for row in batch:
+            yield dict(row._asdict(), genres=genres.get(row.id, []))
+
+
+def show_records():
+    rows = db.session.query(
+        Show.id, Show.start_time, Show.venue_id,
+        Venue.name.label('venue_name'), Show.artist_id,
+        Artist.name.label('artist_name')).join(
+            Venue, Show.venue_id == Venue.id).join(
+                Artist, Show.artist_id == Artist.id).order_by(
+                    Show.id).yield_per(EXPORT_BATCH_SIZE)
+    for row in rows:
+        yield row._asdict()
+
+
+EXPORTS = {
+    'venues': (lambda: entity_records(Venue, venue_genres, 'venue_id'),
+               [c.name for c in Venue.__table__.columns] + ['genres']),
+    'artists': (lambda: entity_records(Artist, artist_genres, 'artist_id'),
+                [c.name for c in Artist.__table__.columns] + ['genres']),
+    'shows': (show_records, [
+        'id', 'start_time', 'venue_id', 'venue_name', 'artist_id',
+        'artist_name'
+    ]),
+}
+
+
+def plain_value(value):
+    if isinstance(value, list):
+        return ';'.join(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode(records, format, fields):
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = lambda record: writer.writerow(
+            [plain_value(record[field]) for field in fields])
+    else:
+        write = lambda record: buffer.write(
+            json.dumps(record, default=plain_value) + '\n')
+
+    for record in records:
+        write(record)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Streams venues, artists or shows in the given format; 400 for any other.
+def export_response(name, format):
+    if format not in FORMATS:
+        abort(400)
+    records, fields = EXPORTS[name]
+    return Response(
+        stream_with_context(encode(records(), format, fields)),
+        mimetype=FORMATS[format],
+        headers={
+            'Content-Disposition': f'attachment; filename={name}.{format}'
+        })
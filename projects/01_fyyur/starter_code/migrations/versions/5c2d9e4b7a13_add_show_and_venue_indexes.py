@@ -0,0 +1,32 @@
+"""add show and venue indexes
+
+Revision ID: 5c2d9e4b7a13
+Revises: 0778f2e88ef4
+Create Date: 2026-10-18 10:12:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2d9e4b7a13'
+down_revision = '0778f2e88ef4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_venue_id_start_time', 'Show',
+                    ['venue_id', 'start_time'])
+    op.create_index('ix_Show_artist_id_start_time', 'Show',
+                    ['artist_id', 'start_time'])
+    op.create_index('ix_Show_start_time_id', 'Show', ['start_time', 'id'])
+    op.create_index('ix_Venue_state_city', 'Venue', ['state', 'city'])
+
+
+def downgrade():
+    op.drop_index('ix_Venue_state_city', table_name='Venue')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
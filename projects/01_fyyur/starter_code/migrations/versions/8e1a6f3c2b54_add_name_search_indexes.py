@@ -0,0 +1,36 @@
+"""add name search indexes
+
+Revision ID: 8e1a6f3c2b54
+Revises: 5c2d9e4b7a13
+Create Date: 2026-10-18 11:03:17.204659
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e1a6f3c2b54'
+down_revision = '5c2d9e4b7a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite databases get FTS5 tables from search.py on first use instead.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_Venue_name_trgm', 'Venue', ['name'],
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+    op.create_index('ix_Artist_name_trgm', 'Artist', ['name'],
+                    postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_Artist_name_trgm', table_name='Artist')
+    op.drop_index('ix_Venue_name_trgm', table_name='Venue')
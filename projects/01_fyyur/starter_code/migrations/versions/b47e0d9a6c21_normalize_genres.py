@@ -0,0 +1,100 @@
+"""normalize genres
+
+Revision ID: b47e0d9a6c21
+Revises: 8e1a6f3c2b54
+Create Date: 2026-10-18 11:48:02.930114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e0d9a6c21'
+down_revision = '8e1a6f3c2b54'
+branch_labels = None
+depends_on = None
+
+genre = sa.table('Genre', sa.column('id', sa.Integer),
+                 sa.column('name', sa.String))
+# (entity table, association table, association foreign key)
+ENTITIES = (('Venue', 'venue_genres', 'venue_id'),
+            ('Artist', 'artist_genres', 'artist_id'))
+
+
+def upgrade():
+    op.create_table('Genre',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('name', sa.String(length=120), nullable=False),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('name'))
+    for table, association, fk in ENTITIES:
+        op.create_table(association,
+                        sa.Column(fk, sa.Integer(), nullable=False),
+                        sa.Column('genre_id', sa.Integer(), nullable=False),
+                        sa.ForeignKeyConstraint([fk], [f'{table}.id'],
+                                                ondelete='CASCADE'),
+                        sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'],
+                                                ondelete='CASCADE'),
+                        sa.PrimaryKeyConstraint(fk, 'genre_id'))
+        op.create_index(f'ix_{association}_genre_id_{fk}', association,
+                        ['genre_id', fk])
+
+    # Move the comma-joined genres column into the association tables.
+    bind = op.get_bind()
+    links = {}
+    for table, association, fk in ENTITIES:
+        entities = sa.table(table, sa.column('id', sa.Integer),
+                            sa.column('genres', sa.String))
+        links[table] = [
+            (entity_id, name)
+            for entity_id, genres in bind.execute(
+                sa.select([entities.c.id, entities.c.genres]))
+            for name in {n.strip() for n in (genres or '').split(',')}
+            if name
+        ]
+
+    names = sorted({name for rows in links.values() for _, name in rows})
+    if names:
+        op.bulk_insert(genre, [{'name': name} for name in names])
+    genre_ids = dict(
+        bind.execute(sa.select([genre.c.name, genre.c.id])).fetchall())
+
+    for table, association, fk in ENTITIES:
+        if links[table]:
+            op.bulk_insert(
+                sa.table(association, sa.column(fk, sa.Integer),
+                         sa.column('genre_id', sa.Integer)),
+                [{
+                    fk: entity_id,
+                    'genre_id': genre_ids[name]
+                } for entity_id, name in links[table]])
+        op.drop_column(table, 'genres')
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table, association, fk in ENTITIES:
+        op.add_column(table,
+                      sa.Column('genres', sa.VARCHAR(length=120), nullable=True))
+        entities = sa.table(table, sa.column('id', sa.Integer),
+                            sa.column('genres', sa.String))
+        links = sa.table(association, sa.column(fk, sa.Integer),
+                         sa.column('genre_id', sa.Integer))
+        joined = {}
+        for entity_id, name in bind.execute(
+                sa.select([links.c[fk], genre.c.name]).select_from(
+                    links.join(genre, links.c.genre_id == genre.c.id)).order_by(
+                        links.c[fk], genre.c.name)):
+            joined.setdefault(entity_id, []).append(name)
+        for entity_id, names in joined.items():
+            bind.execute(entities.update().where(
+                entities.c.id == entity_id).values(genres=','.join(names)))
+        bind.execute(entities.update().where(
+            entities.c.genres.is_(None)).values(genres=''))
+        op.alter_column(table, 'genres',
+                        existing_type=sa.VARCHAR(length=120),
+                        nullable=False)
+        op.drop_index(f'ix_{association}_genre_id_{fk}', table_name=association)
+        op.drop_table(association)
+    op.drop_table('Genre')
@@ -6,9 +6,58 @@ db = SQLAlchemy()
 # Models.
 #----------------------------------------------------------------------------#
 
+# Association tables are keyed by (entity, genre); the extra (genre, entity)
+# index answers "everything with genre X" without scanning.
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id',
+              db.Integer,
+              db.ForeignKey('Venue.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id',
+              db.Integer,
+              db.ForeignKey('Genre.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id'))
+
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id',
+              db.Integer,
+              db.ForeignKey('Artist.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Column('genre_id',
+              db.Integer,
+              db.ForeignKey('Genre.id', ondelete='CASCADE'),
+              primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id'))
+
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+
+# Resolves genre names to Genre rows with one IN query, creating the missing
+# ones in the current session.
+def genres_from_names(names):
+    names = list(dict.fromkeys(n.strip() for n in names if n.strip()))
+    existing = {
+        g.name: g for g in Genre.query.filter(Genre.name.in_(names)).all()
+    } if names else {}
+    return [existing.get(name) or Genre(name=name) for name in names]
+
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer,
                           db.ForeignKey('Artist.id'),
@@ -21,6 +70,7 @@ class Show(db.Model):
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (db.Index('ix_Venue_state_city', 'state', 'city'),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -28,13 +78,19 @@ class Venue(db.Model):
     state = db.Column(db.String(2), nullable=False)
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120), nullable=False, unique=True)
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.relationship('Genre',
+                             secondary=venue_genres,
+                             order_by='Genre.name')
     image_link = db.Column(db.String(500), nullable=False)
     website = db.Column(db.String(500))
     facebook_link = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(120))
 
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
+
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
@@ -44,9 +100,15 @@ class Artist(db.Model):
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(2), nullable=False)
     phone = db.Column(db.String(120), nullable=False, unique=True)
-    genres = db.Column(db.String(120), nullable=False)
+    genres = db.relationship('Genre',
+                             secondary=artist_genres,
+                             order_by='Genre.name')
     image_link = db.Column(db.String(500), nullable=False)
     facebook_link = db.Column(db.String(500))
     website = db.Column(db.String(500))
     seeking_venue = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String(120))
\ No newline at end of file
+    seeking_description = db.Column(db.String(120))
+
+    @property
+    def genre_names(self):
+        return [genre.name for genre in self.genres]
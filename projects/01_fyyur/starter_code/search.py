@@ -0,0 +1,111 @@
+#----------------------------------------------------------------------------#
+# Indexed name search for venues and artists.
+#
+# Every backend turns (model, term) into a selectable of matching ids with a
+# rank column, where a lower rank is a better match:
+#   * TrigramSearch: Postgres pg_trgm, ILIKE served by the GIN trigram
+#     indexes from the add_name_search_indexes migration, ranked by
+#     similarity().
+#   * FTS5Search: SQLite FTS5 tables with the trigram tokenizer, kept in sync
+#     with triggers and ranked by bm25.
+#   * LikeSearch: plain ILIKE, used when neither is available.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy.exc import OperationalError
+
+from models import Artist, Venue, db
+
+SEARCHABLE_MODELS = (Venue, Artist)
+
+
+class LikeSearch:
+
+    def matches(self, model, term):
+        return db.select([model.id,
+                          db.literal_column('0').label('rank')]).where(
+                              model.name.ilike(f"%{term}%"))
+
+
+class TrigramSearch(LikeSearch):
+
+    def matches(self, model, term):
+        return db.select([
+            model.id, (-db.func.similarity(model.name, term)).label('rank')
+        ]).where(model.name.ilike(f"%{term}%"))
+
+
+class FTS5Search(LikeSearch):
+    # The trigram tokenizer cannot match terms shorter than three characters.
+    MIN_TERM_LENGTH = 3
+
+    def setup(self, connection):
+        for model in SEARCHABLE_MODELS:
+            table = model.__tablename__
+            fts = f'{table}_fts'
+            # Triggers are dropped with their table, so their absence means
+            # the index has to be (re)built.
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+                "AND name = ?", (f'{fts}_ai',)).first()
+            if exists:
+                continue
+            connection.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5('
+                f"name, content='{table}', content_rowid='id', "
+                f"tokenize='trigram')")
+            connection.execute(
+                f'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+                f'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); '
+                f'END')
+            connection.execute(
+                f'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+                f'INSERT INTO "{fts}"("{fts}", rowid, name) '
+                f"VALUES ('delete', old.id, old.name); END")
+            connection.execute(
+                f'CREATE TRIGGER "{fts}_au" AFTER UPDATE OF name ON "{table}" '
+                f'BEGIN INSERT INTO "{fts}"("{fts}", rowid, name) '
+                f"VALUES ('delete', old.id, old.name); "
+                f'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); '
+                f'END')
+            connection.execute(
+                f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')')
+
+    def matches(self, model, term):
+        if len(term) < self.MIN_TERM_LENGTH:
+            return super().matches(model, term)
+
+        fts = f'{model.__tablename__}_fts'
+        phrase = '"' + term.replace('"', '""') + '"'
+        return db.text(
+            f'SELECT rowid AS id, rank FROM "{fts}" WHERE "{fts}" MATCH :term'
+        ).bindparams(term=phrase).columns(id=db.Integer, rank=db.Float)
+
+
+_backend = None
+
+
+def search_backend():
+    global _backend
+    if _backend is None:
+        _backend = _detect_backend(db.engine)
+    return _backend
+
+
+def _detect_backend(engine):
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as connection:
+            installed = connection.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first()
+        return TrigramSearch() if installed else LikeSearch()
+
+    if engine.dialect.name == 'sqlite':
+        backend = FTS5Search()
+        try:
+            with engine.begin() as connection:
+                backend.setup(connection)
+        except OperationalError:
+            # SQLite was built without FTS5 or the trigram tokenizer.
+            return LikeSearch()
+        return backend
+
+    return LikeSearch()
@@ -0,0 +1,115 @@
+'''
+bench_concurrency.py
+    drives the trivia API with many threads against a throwaway SQLite
+    database, mixing question listing and quiz turns with new questions,
+    and reports throughput, latency percentiles and failed requests
+
+    python bench_concurrency.py --threads 32 --requests 4000
+    python bench_concurrency.py --legacy    # without WAL and busy_timeout
+'''
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DATABASE_PATH = os.path.join(tempfile.gettempdir(), 'trivia_concurrency.db')
+# models.py reads this when flaskr is imported below.
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE_PATH
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import engine
+from flaskr import create_app
+from models import Category, Question, db
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment',
+              'Sports']
+
+
+def seed(questions):
+    db.session.add_all([Category(name) for name in CATEGORIES])
+    db.session.add_all([
+        Question(f'Question {i}?', f'Answer {i}',
+                 str(i % len(CATEGORIES) + 1), i % 5 + 1)
+        for i in range(questions)
+    ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load the trivia API from many threads at once.')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--legacy', action='store_true',
+                        help='skip the SQLite pragmas from engine.py')
+    args = parser.parse_args()
+
+    if args.legacy:
+        event.remove(Engine, 'connect', engine.set_sqlite_pragmas)
+    for leftover in ('', '-wal', '-shm'):
+        if os.path.exists(DATABASE_PATH + leftover):
+            os.unlink(DATABASE_PATH + leftover)
+
+    app = create_app()
+    with app.app_context():
+        seed(args.questions)
+
+    def request(client, i):
+        if random.random() < args.write_ratio:
+            return client.post('/questions', json={
+                'question': f'New question {i}?',
+                'answer': f'New answer {i}',
+                'category': str(i % len(CATEGORIES) + 1),
+                'difficulty': 1
+            })
+        if i % 3 == 0:
+            return client.post('/quizzes', json={
+                'previous_questions': [],
+                'quiz_category': {'id': i % len(CATEGORIES) + 1}
+            })
+        if i % 3 == 1:
+            return client.get('/categories')
+        return client.get(f'/questions?page={i % 10 + 1}')
+
+    def worker(ids):
+        client = app.test_client()
+        timings, failures = [], 0
+        for i in ids:
+            started = time.perf_counter()
+            response = request(client, i)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures += 1
+        return timings, failures
+
+    chunks = [range(n, args.requests, args.threads)
+              for n in range(args.threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - started
+    for leftover in ('', '-wal', '-shm'):
+        if os.path.exists(DATABASE_PATH + leftover):
+            os.unlink(DATABASE_PATH + leftover)
+
+    timings = sorted(t for chunk, _ in results for t in chunk)
+    failures = sum(f for _, f in results)
+    print(f'{"legacy" if args.legacy else "tuned"}: {args.requests} '
+          f'requests, {args.threads} threads, '
+          f'{args.write_ratio:.0%} writes')
+    print(f'throughput {len(timings) / elapsed:10.0f} req/s')
+    for label, q in (('p50', 0.5), ('p99', 0.99), ('max', 1.0)):
+        value = timings[min(int(q * len(timings)), len(timings) - 1)]
+        print(f'{label:<11}{value * 1000:10.1f} ms')
+    print(f'failed     {failures:10d}')
+
+
+if __name__ == '__main__':
+    main()
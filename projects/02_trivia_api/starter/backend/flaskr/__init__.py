@@ -1,29 +1,50 @@
 import os
-import random
 
-from flask import Flask, abort, jsonify, request
+from flask import (Flask, Response, abort, jsonify, request,
+                   stream_with_context)
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from models import Category, Question, setup_db
+from sqlalchemy import func
+from models import Question, db, setup_db
+
+from .bulk import (QuestionImportError, decoded_lines, export_questions,
+                   export_questions_command, import_questions,
+                   import_questions_command)
+from .categories import CategoryCache
+from .quiz import QuestionPool, QuizSessions
+from .search import search_backend
 
 QUESTIONS_PER_PAGE = 10
+# Search results are counted up to this many. Past it the total is a floor
+# and results are listed by id, since ranking every match would dominate.
+SEARCH_COUNT_LIMIT = 1000
 
 
+# selection is a query ordered by Question.id. ?after=<id> continues from
+# the last id of the previous page (keyset), ?page=<n> uses OFFSET.
 def paginate_questions(request, selection):
+    after = request.args.get('after', type=int)
     page = request.args.get('page', 1, type=int)
-    start = QUESTIONS_PER_PAGE * (page - 1)
-    end = QUESTIONS_PER_PAGE + start
 
-    questions = selection
-    questions = [q.format() for q in questions][start:end]
+    if after is not None:
+        selection = selection.filter(Question.id > after)
+    elif page < 1:
+        return []
+    else:
+        selection = selection.offset(QUESTIONS_PER_PAGE * (page - 1))
 
-    return questions
+    return [q.format() for q in selection.limit(QUESTIONS_PER_PAGE)]
 
 
 def create_app(test_config=None):
     app = Flask(__name__)
     setup_db(app)
     CORS(app)
+    question_pool = QuestionPool()
+    quiz_sessions = QuizSessions(question_pool)
+    categories = CategoryCache()
+    app.cli.add_command(import_questions_command)
+    app.cli.add_command(export_questions_command)
 
     # CORS Headers
     @app.after_request
@@ -36,16 +57,12 @@ def create_app(test_config=None):
 
     @app.route('/categories')
     def get_categories():
-        categories = Category.query.all()
-        categories = [c.format() for c in categories]
-        return jsonify({'success': True, 'categories': categories})
+        return categories.response()
 
     @app.route('/questions')
     def get_questions():
-        questions = paginate_questions(
-            request,
-            Question.query.order_by(Question.id).all())
-        categories = [c.format() for c in Category.query.all()]
+        questions = paginate_questions(request,
+                                       Question.query.order_by(Question.id))
 
         if len(questions) == 0:
             abort(404)
@@ -53,9 +70,12 @@ def create_app(test_config=None):
         return jsonify({
             'success': True,
             'questions': questions,
-            'current_category': categories[0].get('type'),
-            'categories': categories,
-            'total_questions': len(Question.query.all())
+            'current_category': categories.all()[0].get('type'),
+            'categories': categories.all(),
+            'total_questions': db.session.query(func.count(
+                Question.id)).scalar(),
+            'next_cursor': questions[-1]['id']
+            if len(questions) == QUESTIONS_PER_PAGE else None
         })
 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
@@ -66,6 +86,7 @@ def create_app(test_config=None):
             abort(404)
 
         q.delete()
+        question_pool.remove(question_id)
         return jsonify({
             'success': True,
         }), 200
@@ -78,78 +99,157 @@ def create_app(test_config=None):
             abort(404)
 
         q = Question(body.get('question', ''), body.get('answer', ''),
-                     body.get('category', ''), body.get('difficulty', ''))
+                     body.get('category'), body.get('difficulty', ''))
         q.insert()
+        question_pool.add(q.id, q.category)
         return jsonify({'success': True, 'id': q.id}), 200
 
+    # Streams an NDJSON body (or CSV with ?format=csv / Content-Type
+    # text/csv) into the questions table in committed batches.
+    @app.route('/questions/import', methods=['POST'])
+    def import_question_file():
+        format = request.args.get(
+            'format', 'csv' if request.mimetype == 'text/csv' else 'ndjson')
+        if format not in ('ndjson', 'csv'):
+            abort(400)
+
+        try:
+            imported = import_questions(
+                decoded_lines(request.stream), format,
+                progress=lambda n: app.logger.info('%d questions imported',
+                                                   n))
+        except QuestionImportError as e:
+            return jsonify({
+                'success': False,
+                'error': 422,
+                'message': str(e),
+                'imported': e.imported
+            }), 422
+        except UnicodeDecodeError:
+            abort(400)
+        finally:
+            question_pool.reset()
+
+        return jsonify({'success': True, 'imported': imported})
+
+    @app.route('/questions/export')
+    def export_question_file():
+        format = request.args.get('format', 'ndjson')
+        if format not in ('ndjson', 'csv'):
+            abort(400)
+
+        return Response(
+            stream_with_context(export_questions(format)),
+            mimetype='text/csv' if format == 'csv' else 'application/x-ndjson')
+
     @app.route('/questions/search', methods=['POST'])
     def search_questions():
-        search_term = request.get_json()['searchTerm']
+        body = request.get_json()
+
+        if not body or 'searchTerm' not in body or not isinstance(
+                body['searchTerm'], str):
+            abort(400)
+
+        page = body.get('page', request.args.get('page', 1, type=int))
+        if not isinstance(page, int) or page < 1:
+            abort(400)
+
+        backend = search_backend()
+        term = body['searchTerm']
+        counted = backend.matches(term).alias('counted')
+        total = db.session.query(func.count()).select_from(
+            db.select([counted.c.id]).limit(SEARCH_COUNT_LIMIT +
+                                            1).alias('capped')).scalar()
+
+        matches = backend.page(term, QUESTIONS_PER_PAGE,
+                               QUESTIONS_PER_PAGE * (page - 1),
+                               ranked=total <= SEARCH_COUNT_LIMIT).alias(
+                                   'matches')
         questions = [
-            q.format() for q in Question.query.order_by(Question.id).filter(
-                Question.question.ilike(f"%{search_term}%")).all()
+            q.format() for q in Question.query.join(
+                matches, Question.id == matches.c.id).order_by(
+                    matches.c.rank, Question.id)
         ]
+
         return jsonify({
             'success': True,
             'questions': questions,
-            'totalQuestions': len(questions),
+            'totalQuestions': min(total, SEARCH_COUNT_LIMIT),
+            'totalQuestionsExact': total <= SEARCH_COUNT_LIMIT,
             'currentCategory': ''
         }), 200
 
     @app.route('/categories/<int:category_id>/questions')
     def get_questions_by_category(category_id):
+        current_category = categories.type_of(category_id)
+
+        if current_category is None:
+            abort(404)
+
         questions = [
-            q.format() for q in Question.query.join(
-                Category, Question.category == Category.id).filter(
-                    Category.id == category_id).all()
+            q.format() for q in Question.query.filter(
+                Question.category == category_id).order_by(Question.id)
         ]
         return jsonify({
             'success': True,
             'questions': questions,
             'totalQuestions': len(questions),
-            'currentCategory': Category.query.get(category_id).type
+            'currentCategory': current_category
         })
 
     @app.route('/quizzes', methods=['POST'])
     def quizzes():
         body = request.get_json()
-        previous_questions = body['previous_questions']  # By ID
-        quiz_category = int(body['quiz_category']['id'])
-
-        # If ALL
-        if quiz_category == 0:
-            questions = [q.format() for q in Question.query.all()]
-
-            # Don't choose from previous questions
-            questions = list(
-                filter(lambda x: int(x['id']) not in previous_questions,
-                       questions))
-
-            # If there's no questions left, force end
-            if not questions:
-                return jsonify({'success': True, 'forceEnd': True})
-
-            question = random.choice(questions)
-            return jsonify({'success': True, 'question': question})
-
-        else:
-            questions = [
-                q.format() for q in Question.query.join(
-                    Category, Question.category == Category.id).filter(
-                        Category.id == quiz_category).all()
-            ]
-
-            # Don't choose from previous questions
-            questions = list(
-                filter(lambda x: int(x['id']) not in previous_questions,
-                       questions))
-
-            # If there's no questions left, force end
-            if not questions:
-                return jsonify({'success': True, 'forceEnd': True})
-
-            question = random.choice(questions)
-            return jsonify({'success': True, 'question': question})
+        previous_questions = set(body['previous_questions'])  # By ID
+        quiz_category = int(body['quiz_category']['id'])  # 0 is ALL
+
+        question = question_pool.next_question(quiz_category,
+                                               previous_questions)
+
+        # If there's no questions left, force end
+        if question is None:
+            return jsonify({'success': True, 'forceEnd': True})
+
+        return jsonify({'success': True, 'question': question.format()})
+
+    # Quiz sessions keep the shuffled deck on the server, so a turn sends
+    # only the session id instead of every previous question.
+    @app.route('/quizzes/sessions', methods=['POST'])
+    def start_quiz_session():
+        body = request.get_json()
+
+        if not body or 'quiz_category' not in body:
+            abort(400)
+
+        try:
+            quiz_category = int(body['quiz_category']['id'])  # 0 is ALL
+        except (KeyError, TypeError, ValueError):
+            abort(400)
+
+        session_id, total = quiz_sessions.start(quiz_category)
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'total_questions': total
+        })
+
+    @app.route('/quizzes/sessions/<session_id>/next', methods=['POST'])
+    def next_quiz_question(session_id):
+        try:
+            question = quiz_sessions.next_question(session_id)
+        except KeyError:
+            abort(404)
+
+        # If there's no questions left, force end
+        if question is None:
+            return jsonify({'success': True, 'forceEnd': True})
+
+        return jsonify({'success': True, 'question': question.format()})
+
+    @app.route('/quizzes/sessions/<session_id>', methods=['DELETE'])
+    def end_quiz_session(session_id):
+        quiz_sessions.end(session_id)
+        return jsonify({'success': True})
 
     @app.errorhandler(404)
     def not_found(error):
@@ -0,0 +1,201 @@
+import codecs
+import csv
+import io
+import json
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import DBAPIError
+
+from models import Category, Question, db
+
+FIELDS = ('question', 'answer', 'category', 'difficulty')
+EXPORT_FIELDS = ('id', ) + FIELDS
+BATCH_SIZE = 5000
+# category and difficulty are 32-bit integer columns.
+INT_MIN, INT_MAX = -2**31, 2**31 - 1
+
+'''
+Bulk question import and export
+
+Both directions stream: imports read records one at a time from any
+iterable of text lines and insert them in batches of BATCH_SIZE, one
+transaction per batch; exports page through the table with yield_per and
+yield one line per question. Memory stays flat whatever the file size.
+    - formats are 'ndjson' (one JSON object per line) and 'csv' (with a
+      header row naming the FIELDS columns)
+    - ids are not imported, the database assigns new ones
+    - categories must exist; each batch checks its category ids with one
+      query before inserting
+'''
+
+
+class QuestionImportError(ValueError):
+
+    def __init__(self, line, message, last_line=None):
+        if last_line is None or last_line == line:
+            super().__init__(f'line {line}: {message}')
+        else:
+            super().__init__(f'lines {line}-{last_line}: {message}')
+        self.line = line
+        self.imported = 0
+
+
+def _optional_int(value):
+    if value is None or value == '':
+        return None
+    value = int(value)
+    if not INT_MIN <= value <= INT_MAX:
+        raise ValueError(f'{value} is out of range')
+    return value
+
+
+def _row(record):
+    question = record.get('question')
+    answer = record.get('answer')
+    if not question or not answer:
+        raise ValueError('question and answer are required')
+    return {
+        'question': question,
+        'answer': answer,
+        'category': _optional_int(record.get('category')),
+        'difficulty': _optional_int(record.get('difficulty'))
+    }
+
+
+def _rows(lines, format):
+    if format == 'ndjson':
+        records = ((number, line) for number, line in enumerate(lines, 1)
+                   if line.strip())
+    elif format == 'csv':
+        # Line 1 is the header.
+        records = enumerate(csv.DictReader(lines), 2)
+    else:
+        raise ValueError(f'unknown format {format!r}')
+
+    for number, record in records:
+        try:
+            if format == 'ndjson':
+                record = json.loads(record)
+            yield number, _row(record)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise QuestionImportError(number, str(e))
+
+
+def _check_categories(batch):
+    ids = {row['category'] for _, row in batch} - {None}
+    if not ids:
+        return
+    known = {
+        category_id for category_id, in db.session.query(Category.id).filter(
+            Category.id.in_(ids))
+    }
+    for number, row in batch:
+        if row['category'] is not None and row['category'] not in known:
+            raise QuestionImportError(
+                number, f"unknown category {row['category']}")
+
+
+'''
+import_questions(lines, format, batch_size, progress)
+    inserts the questions read from lines and returns how many there were
+    each batch is committed before the next is read, so a bad record, an
+    unknown category or a batch the database rejects raises
+    QuestionImportError with .imported set to the questions already
+    committed; progress(count) is called after every batch
+'''
+def import_questions(lines, format='ndjson', batch_size=BATCH_SIZE,
+                     progress=None):
+    imported = 0
+    rows = _rows(lines, format)
+    while True:
+        try:
+            batch = list(islice(rows, batch_size))
+        except QuestionImportError as e:
+            e.imported = imported
+            raise
+        if not batch:
+            return imported
+
+        try:
+            _check_categories(batch)
+            db.session.execute(Question.__table__.insert(),
+                               [row for _, row in batch])
+            db.session.commit()
+        except QuestionImportError as e:
+            db.session.rollback()
+            e.imported = imported
+            raise
+        except DBAPIError as e:
+            db.session.rollback()
+            error = QuestionImportError(batch[0][0],
+                                        str(e.orig).partition('\n')[0],
+                                        batch[-1][0])
+            error.imported = imported
+            raise error from e
+        except Exception:
+            db.session.rollback()
+            raise
+        imported += len(batch)
+        if progress:
+            progress(imported)
+
+
+def export_questions(format='ndjson'):
+    columns = [getattr(Question, field) for field in EXPORT_FIELDS]
+    rows = db.session.query(*columns).order_by(Question.id).yield_per(1000)
+
+    if format == 'ndjson':
+        for row in rows:
+            yield json.dumps(row._asdict()) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def decoded_lines(stream):
+    return codecs.iterdecode(stream, 'utf-8')
+
+
+@click.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', type=click.Choice(['ndjson', 'csv']),
+              help='Defaults to the file extension.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@with_appcontext
+def import_questions_command(path, format, batch_size):
+    '''Import questions from an NDJSON or CSV file.'''
+    format = format or ('csv' if path.endswith('.csv') else 'ndjson')
+    with open(path, encoding='utf-8', newline='') as f:
+        try:
+            imported = import_questions(
+                f, format, batch_size,
+                lambda n: click.echo(f'\r{n} questions imported', nl=False))
+        except QuestionImportError as e:
+            click.echo()
+            raise click.ClickException(
+                f'{e} ({e.imported} questions were imported before it)')
+    click.echo(f'\r{imported} questions imported')
+
+
+@click.command('export-questions')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', type=click.Choice(['ndjson', 'csv']),
+              help='Defaults to the file extension.')
+@with_appcontext
+def export_questions_command(path, format):
+    '''Export every question to an NDJSON or CSV file.'''
+    format = format or ('csv' if path.endswith('.csv') else 'ndjson')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in export_questions(format):
+            f.write(chunk)
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+import weakref
+
+from flask import Response
+from sqlalchemy import event
+
+from models import Category
+
+# every live CategoryCache; the mapper listeners below are registered once
+# for the process and invalidate whichever caches still exist, so creating
+# an app per test does not pile up listeners
+_caches = weakref.WeakSet()
+
+
+@event.listens_for(Category, 'after_insert')
+@event.listens_for(Category, 'after_update')
+@event.listens_for(Category, 'after_delete')
+def _on_change(mapper, connection, target):
+    for cache in list(_caches):
+        cache.invalidate()
+
+
+'''
+CategoryCache
+    categories change far less often than they are read, so the formatted
+    list, an id -> type lookup and the encoded GET /categories body are
+    built once and shared by every handler
+    - invalidate() drops them; inserts, updates and deletes of Category
+      rows made through the ORM call it automatically
+    - entries are also rebuilt every max_age seconds to pick up changes
+      made outside this process
+'''
+class CategoryCache:
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._entry = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+    def _current(self):
+        with self._lock:
+            if (self._entry is None
+                    or time.monotonic() - self._loaded_at > self.max_age):
+                categories = [
+                    c.format() for c in Category.query.order_by(Category.id)
+                ]
+                self._entry = (categories,
+                               {c['id']: c['type'] for c in categories},
+                               json.dumps({
+                                   'categories': categories,
+                                   'success': True
+                               }).encode())
+                self._loaded_at = time.monotonic()
+            return self._entry
+
+    def all(self):
+        return self._current()[0]
+
+    def type_of(self, category_id):
+        return self._current()[1].get(category_id)
+
+    def response(self):
+        return Response(self._current()[2], mimetype='application/json')
@@ -0,0 +1,226 @@
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from models import Question, db
+
+ALL_CATEGORIES = 0
+
+
+'''
+IdBucket
+    question ids kept in a list for random.choice, with each id's position
+    so that removing one is a swap with the last element and a pop
+'''
+class IdBucket:
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def add(self, question_id):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+
+    def remove(self, question_id):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        last = self.ids.pop()
+        if last != question_id:
+            self.ids[position] = last
+            self.positions[last] = position
+
+
+def category_key(category):
+    try:
+        return int(category)
+    except (TypeError, ValueError):
+        return None
+
+
+'''
+QuestionPool
+    in-memory index of question ids per category (0 holds every question),
+    used to pick a random unseen question without loading the table
+    - loaded from (id, category) pairs on first use and every max_age
+      seconds, so writes made by other processes are picked up eventually
+    - add() and remove() keep it current for writes made by this process
+'''
+class QuestionPool:
+
+    def __init__(self, max_age=300, attempts=16):
+        self.max_age = max_age
+        self.attempts = attempts
+        self._buckets = None
+        self._snapshots = {}
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        buckets = defaultdict(IdBucket)
+        rows = db.session.query(Question.id, Question.category)
+        for question_id, category in rows.yield_per(10000):
+            buckets[ALL_CATEGORIES].add(question_id)
+            key = category_key(category)
+            if key is not None:
+                buckets[key].add(question_id)
+        return buckets
+
+    def _current(self):
+        if (self._buckets is None
+                or time.monotonic() - self._loaded_at > self.max_age):
+            self._buckets = self._load()
+            self._snapshots.clear()
+            self._loaded_at = time.monotonic()
+        return self._buckets
+
+    # Forces a reload on next use, e.g. after a bulk import.
+    def reset(self):
+        with self._lock:
+            self._buckets = None
+            self._snapshots.clear()
+
+    def add(self, question_id, category):
+        with self._lock:
+            if self._buckets is None:
+                return
+            self._buckets[ALL_CATEGORIES].add(question_id)
+            key = category_key(category)
+            if key is not None:
+                self._buckets[key].add(question_id)
+            self._snapshots.clear()
+
+    def remove(self, question_id):
+        with self._lock:
+            if self._buckets is None:
+                return
+            for bucket in self._buckets.values():
+                bucket.remove(question_id)
+            self._snapshots.clear()
+
+    # Immutable copy of a category's ids, shared by every deck dealt from it
+    # until the next write.
+    def snapshot(self, category):
+        with self._lock:
+            buckets = self._current()
+            if category not in self._snapshots:
+                bucket = buckets.get(category)
+                self._snapshots[category] = tuple(bucket.ids if bucket else ())
+            return self._snapshots[category]
+
+    '''
+    pick(category, seen)
+        returns a random id from the category that is not in the set seen,
+        or None once every question has been seen
+        random draws are retried a few times before falling back to a scan,
+        which only happens once most of the category has been seen
+    '''
+    def pick(self, category, seen):
+        with self._lock:
+            bucket = self._current().get(category)
+            if not bucket or not bucket.ids:
+                return None
+            ids = bucket.ids
+            for _ in range(self.attempts):
+                question_id = random.choice(ids)
+                if question_id not in seen:
+                    return question_id
+            remaining = [i for i in ids if i not in seen]
+            return random.choice(remaining) if remaining else None
+
+    def next_question(self, category, seen):
+        while True:
+            question_id = self.pick(category, seen)
+            if question_id is None:
+                return None
+            question = Question.query.get(question_id)
+            if question is not None:
+                return question
+            # Deleted by another process since the pool was loaded.
+            self.remove(question_id)
+
+
+'''
+Deck
+    a lazily shuffled view of a snapshot of ids: each draw() is one
+    Fisher-Yates step, and only the slots it has touched are stored, so
+    dealing a deck is O(1) and a draw never scans the snapshot
+'''
+class Deck:
+
+    def __init__(self, ids):
+        self.ids = ids
+        self.remaining = len(ids)
+        self.swapped = {}
+
+    def draw(self):
+        if not self.remaining:
+            return None
+        slot = random.randrange(self.remaining)
+        last = self.remaining - 1
+        picked = self.swapped.get(slot, self.ids[slot])
+        self.swapped[slot] = self.swapped.pop(last, self.ids[last])
+        self.remaining = last
+        return picked
+
+
+'''
+QuizSessions
+    server-side quiz sessions, each holding a Deck for its category
+    - a session expires ttl seconds after it was last used, and the
+      least recently used ones are dropped past max_sessions
+    - next_question raises KeyError for unknown or expired sessions
+    - sessions live in this process's memory; each worker of a
+      multi-process server has its own, so clients must be pinned to one
+'''
+class QuizSessions:
+
+    def __init__(self, pool, ttl=3600, max_sessions=10000):
+        self.pool = pool
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, (deck, expires_at) = next(iter(self._sessions.items()))
+            if expires_at > now and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def start(self, category):
+        deck = Deck(self.pool.snapshot(category))
+        session_id = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = (deck, now + self.ttl)
+            self._evict(now)
+        return session_id, deck.remaining
+
+    def _draw(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            deck, _ = self._sessions[session_id]
+            self._sessions[session_id] = (deck, now + self.ttl)
+            self._sessions.move_to_end(session_id)
+            return deck.draw()
+
+    def next_question(self, session_id):
+        while True:
+            question_id = self._draw(session_id)
+            if question_id is None:
+                return None
+            question = Question.query.get(question_id)
+            # Skip questions deleted since the deck was dealt.
+            if question is not None:
+                return question
+
+    def end(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,170 @@
+import re
+
+from sqlalchemy.exc import DBAPIError
+
+from models import Question, db
+
+'''
+Full-text question search
+
+Every backend turns a search term into a selectable of matching question
+ids with a rank column, where a lower rank is a better match. Terms are
+split into words and each word matches as a prefix, across both the
+question and the answer.
+    - matches(term) selects every match, unordered, for counting
+    - page(term, limit, offset, ranked) selects one page, ordered by rank
+      or, when ranked is False, by id; ordering and LIMIT are applied
+      inside the index query so a page of a very common word does not
+      rank or sort every match
+    - PostgresSearch: GIN index over to_tsvector('english', ...), ranked
+      by ts_rank; the index ships with trivia.psql and
+      migrations/002_question_search_index.sql and is never built here
+    - FTS5Search: external-content FTS5 table kept in sync with triggers,
+      ranked by bm25
+    - LikeSearch: plain ILIKE, used when neither is available
+The backend is chosen once per process; setup(connection) returns False
+when it cannot be used on this database.
+'''
+
+
+def search_words(term):
+    return re.findall(r'\w+', term.lower())
+
+
+class LikeSearch:
+
+    def matches(self, term):
+        pattern = f'%{term}%'
+        return db.select([
+            Question.id, db.literal_column('0').label('rank')
+        ]).where(
+            db.or_(Question.question.ilike(pattern),
+                   Question.answer.ilike(pattern)))
+
+    def page(self, term, limit, offset, ranked=True):
+        return self.matches(term).order_by(Question.id).limit(limit).offset(
+            offset)
+
+    def _text(self, sql, query, **params):
+        return db.text(sql).bindparams(query=query, **params).columns(
+            id=db.Integer, rank=db.Float)
+
+
+class PostgresSearch(LikeSearch):
+    DOCUMENT = ("to_tsvector('english', coalesce(question, '') || ' ' || "
+                "coalesce(answer, ''))")
+
+    def setup(self, connection):
+        # Read-only: building the index here would block inserts and could
+        # be cancelled by statement_timeout.
+        return bool(
+            connection.execute(
+                'SELECT i.indisvalid FROM pg_index i '
+                'JOIN pg_class c ON c.oid = i.indexrelid '
+                "WHERE c.relname = 'ix_questions_search'").scalar())
+
+    def _query(self, term):
+        return ' & '.join(f'{word}:*' for word in search_words(term))
+
+    def matches(self, term):
+        if not search_words(term):
+            return super().matches(term)
+
+        return self._text(
+            f"SELECT id, 0 AS rank FROM questions WHERE {self.DOCUMENT} @@ "
+            f"to_tsquery('english', :query)", self._query(term))
+
+    def page(self, term, limit, offset, ranked=True):
+        if not search_words(term):
+            return super().page(term, limit, offset, ranked)
+
+        rank = (f"-ts_rank({self.DOCUMENT}, to_tsquery('english', :query))"
+                if ranked else '0')
+        return self._text(
+            f"SELECT id, {rank} AS rank FROM questions WHERE "
+            f"{self.DOCUMENT} @@ to_tsquery('english', :query) "
+            f"ORDER BY rank, id LIMIT :limit OFFSET :offset",
+            self._query(term), limit=limit, offset=offset)
+
+
+class FTS5Search(LikeSearch):
+
+    def setup(self, connection):
+        # Triggers are dropped with their table, so their absence means the
+        # index has to be (re)built.
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+            "AND name = 'questions_fts_ai'").first()
+        if exists:
+            return True
+        connection.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5('
+            "question, answer, content='questions', content_rowid='id', "
+            "tokenize='porter unicode61')")
+        connection.execute(
+            'CREATE TRIGGER questions_fts_ai AFTER INSERT ON questions BEGIN '
+            'INSERT INTO questions_fts(rowid, question, answer) '
+            'VALUES (new.id, new.question, new.answer); END')
+        connection.execute(
+            'CREATE TRIGGER questions_fts_ad AFTER DELETE ON questions BEGIN '
+            'INSERT INTO questions_fts(questions_fts, rowid, question, answer) '
+            "VALUES ('delete', old.id, old.question, old.answer); END")
+        connection.execute(
+            'CREATE TRIGGER questions_fts_au AFTER UPDATE OF question, answer '
+            'ON questions BEGIN '
+            'INSERT INTO questions_fts(questions_fts, rowid, question, answer) '
+            "VALUES ('delete', old.id, old.question, old.answer); "
+            'INSERT INTO questions_fts(rowid, question, answer) '
+            'VALUES (new.id, new.question, new.answer); END')
+        connection.execute(
+            "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')")
+        return True
+
+    def _query(self, term):
+        return ' '.join(f'"{word}"*' for word in search_words(term))
+
+    def matches(self, term):
+        if not search_words(term):
+            return super().matches(term)
+
+        return self._text(
+            'SELECT rowid AS id, 0 AS rank FROM questions_fts '
+            'WHERE questions_fts MATCH :query', self._query(term))
+
+    def page(self, term, limit, offset, ranked=True):
+        if not search_words(term):
+            return super().page(term, limit, offset, ranked)
+
+        order = 'rank, rowid' if ranked else 'rowid'
+        return self._text(
+            f'SELECT rowid AS id, {"rank" if ranked else "0"} AS rank '
+            f'FROM questions_fts WHERE questions_fts MATCH :query '
+            f'ORDER BY {order} LIMIT :limit OFFSET :offset',
+            self._query(term), limit=limit, offset=offset)
+
+
+_backend = None
+
+
+def search_backend():
+    global _backend
+    if _backend is None:
+        _backend = _detect_backend(db.engine)
+    return _backend
+
+
+def _detect_backend(engine):
+    backends = {'postgresql': PostgresSearch, 'sqlite': FTS5Search}
+    if engine.dialect.name not in backends:
+        return LikeSearch()
+
+    backend = backends[engine.dialect.name]()
+    try:
+        with engine.begin() as connection:
+            if backend.setup(connection):
+                return backend
+    except DBAPIError:
+        # The search index is missing or cannot be read, or SQLite was
+        # built without FTS5.
+        pass
+    return LikeSearch()
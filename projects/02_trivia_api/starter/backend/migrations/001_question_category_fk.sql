@@ -0,0 +1,41 @@
+--
+-- questions.category as an indexed integer foreign key to categories.id.
+--
+-- Databases restored from an old dump, or created by the app while the
+-- model declared the column as a string, may hold it as text. Converting
+-- it lets category listings and quiz selection use the (category, id)
+-- index instead of casting every row. Safe to run more than once:
+--
+--   psql trivia < migrations/001_question_category_fk.sql
+--
+
+BEGIN;
+
+DO $$
+BEGIN
+    -- Changing the type rewrites the table under an ACCESS EXCLUSIVE lock,
+    -- so only do it when the column is not an integer already.
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'questions'
+            AND column_name = 'category' AND data_type <> 'integer'
+    ) THEN
+        ALTER TABLE public.questions
+            ALTER COLUMN category TYPE integer
+            USING NULLIF(category::text, '')::integer;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'public.questions'::regclass AND contype = 'f'
+    ) THEN
+        ALTER TABLE ONLY public.questions
+            ADD CONSTRAINT category FOREIGN KEY (category) REFERENCES public.categories(id) ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS ix_questions_category_id
+    ON public.questions USING btree (category, id);
+
+COMMIT;
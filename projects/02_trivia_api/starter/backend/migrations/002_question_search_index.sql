@@ -0,0 +1,20 @@
+--
+-- GIN index for full-text search over questions and answers.
+--
+-- The expression must match PostgresSearch.DOCUMENT in flaskr/search.py
+-- for the planner to use it; /questions/search falls back to ILIKE while
+-- the index is missing. It is built CONCURRENTLY so inserts are not
+-- blocked, which cannot run inside a transaction block, and without the
+-- app's statement_timeout. An interrupted build leaves an invalid index
+-- behind; drop it with DROP INDEX CONCURRENTLY ix_questions_search and run
+-- this again. Safe to run more than once:
+--
+--   psql trivia < migrations/002_question_search_index.sql
+--
+
+SET statement_timeout = 0;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_search
+    ON public.questions USING gin (
+        to_tsvector('english', coalesce(question, '') || ' ' || coalesce(answer, ''))
+    );
@@ -1,10 +1,14 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import (Column, ForeignKey, Index, Integer, String,
+                        create_engine)
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from engine import engine_options
+
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    'DATABASE_URL', "postgres://{}/{}".format('localhost:5432', database_name))
 
 db = SQLAlchemy()
 
@@ -15,6 +19,7 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -29,9 +34,15 @@ class Question(db.Model):
   id = Column(Integer, primary_key=True)
   question = Column(String)
   answer = Column(String)
-  category = Column(String)
+  category = Column(Integer,
+                    ForeignKey('categories.id', onupdate='CASCADE',
+                               ondelete='SET NULL'))
   difficulty = Column(Integer)
 
+  # Category listings and quiz decks are range scans on this index; see
+  # migrations/001_question_category_fk.sql for existing databases.
+  __table_args__ = (Index('ix_questions_category_id', 'category', 'id'),)
+
   def __init__(self, question, answer, category, difficulty):
     self.question = question
     self.answer = answer
@@ -54,6 +54,19 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertFalse('questions' in data)
 
+    def test_get_questions_after_cursor(self):
+        first = json.loads(self.client().get('/questions').data)
+        response = self.client().get(
+            f"/questions?after={first['next_cursor']}")
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['total_questions'], first['total_questions'])
+        self.assertGreater(data['questions'][0]['id'], first['next_cursor'])
+        self.assertEqual(
+            data['questions'],
+            json.loads(self.client().get('/questions?page=2').data)['questions'])
+
     def test_delete_question(self):
         before = Question.query.count()
         response = self.client().delete('/questions/10')
@@ -94,7 +107,64 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(Question.query.get(data['id']).difficulty, 5)
         self.assertGreater(after, before)
 
+    def test_import_questions(self):
+        before = Question.query.count()
+        response = self.client().post(
+            '/questions/import',
+            data='{"question": "a", "answer": "b", "category": 1}\n'
+            '{"question": "c", "answer": "d", "difficulty": 2}\n')
+        data = json.loads(response.data)
+        after = Question.query.count()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual(after, before + 2)
+
+    def test_422_import_questions(self):
+        response = self.client().post('/questions/import?format=csv',
+                                      data='question,answer\nno answer,\n')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['imported'], 0)
+        self.assertTrue(data['message'].startswith('line 2'))
+
+    def test_422_import_questions_unknown_category(self):
+        before = Question.query.count()
+        response = self.client().post(
+            '/questions/import',
+            data='{"question": "a", "answer": "b", "category": 1}\n'
+            '{"question": "c", "answer": "d", "category": 1000}\n')
+        data = json.loads(response.data)
+        after = Question.query.count()
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['imported'], 0)
+        self.assertTrue(data['message'].startswith('line 2'))
+        self.assertEqual(after, before)
+
+    def test_422_import_questions_out_of_range(self):
+        response = self.client().post(
+            '/questions/import',
+            data='{"question": "a", "answer": "b", '
+            '"difficulty": 99999999999999999999999}\n')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['imported'], 0)
+        self.assertTrue(data['message'].startswith('line 1'))
+
+    def test_export_questions(self):
+        response = self.client().get('/questions/export')
+        lines = response.data.decode().splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(lines), Question.query.count())
+        self.assertTrue('answer' in json.loads(lines[0]))
+
     def test_search_question(self):
+        # Full-text search matches words, so "entitled" no longer matches.
         response = self.client().post('/questions/search',
                                       json={'searchTerm': 'title'})
         data = json.loads(response.data)
@@ -102,7 +172,34 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data['success'], True)
         self.assertTrue('questions' in data)
-        self.assertEqual(len(data['questions']), 2)
+        self.assertEqual(len(data['questions']), 1)
+        self.assertEqual(data['questions'][0]['id'], 6)
+        self.assertEqual(data['totalQuestions'], 1)
+        self.assertTrue(data['totalQuestionsExact'])
+
+    def test_search_question_answer_prefix(self):
+        response = self.client().post('/questions/search',
+                                      json={'searchTerm': 'scissor'})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['questions'][0]['answer'],
+                         'Edward Scissorhands')
+
+    def test_400_search_question(self):
+        response = self.client().post('/questions/search', json={})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
+
+    def test_400_search_question_not_a_string(self):
+        response = self.client().post('/questions/search',
+                                      json={'searchTerm': 5})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data['success'], False)
 
     def test_get_question_by_category(self):
         response = self.client().get('/categories/1/questions')
@@ -113,6 +210,13 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue('questions' in data)
         self.assertEqual(len(data['questions']), 4)
     
+    def test_404_get_question_by_category(self):
+        response = self.client().get('/categories/1000/questions')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+
     def test_quizzes(self):
         response = self.client().post('/quizzes', json={
             'previous_questions': [20, 21],
@@ -137,6 +241,59 @@ class TriviaTestCase(unittest.TestCase):
         self.assertFalse('question' in data)
         self.assertTrue('forceEnd' in data)
 
+    def test_quizzes_pick_up_new_question(self):
+        created = json.loads(self.client().post('/questions', json={
+            'question': 'new art question',
+            'answer': 'b',
+            'category': '2',
+            'difficulty': '1'
+        }).data)
+        response = self.client().post('/quizzes', json={
+            'previous_questions': [16, 17, 18, 19],
+            'quiz_category': {'id': 2}
+        })
+        data = json.loads(response.data)
+        self.client().delete(f"/questions/{created['id']}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['question']['id'], created['id'])
+
+    def test_quiz_session(self):
+        response = self.client().post('/quizzes/sessions', json={
+            'quiz_category': {'id': 2}
+        })
+        data = json.loads(response.data)
+        session_id = data['session_id']
+
+        seen = set()
+        for _ in range(data['total_questions']):
+            next_data = json.loads(self.client().post(
+                f'/quizzes/sessions/{session_id}/next').data)
+            self.assertEqual(next_data['question']['category'], 2)
+            seen.add(next_data['question']['id'])
+        end_data = json.loads(self.client().post(
+            f'/quizzes/sessions/{session_id}/next').data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(seen), data['total_questions'])
+        self.assertTrue(end_data['forceEnd'])
+
+    def test_404_quiz_session(self):
+        response = self.client().post('/quizzes/sessions/missing/next')
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+
+    def test_400_quiz_session(self):
+        for quiz_category in (3, {}, {'id': 'science'}):
+            response = self.client().post(
+                '/quizzes/sessions', json={'quiz_category': quiz_category})
+            data = json.loads(response.data)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['success'], False)
+
     def tearDown(self):
         """Executed after reach test"""
         pass
@@ -0,0 +1,96 @@
+'''
+bench_auth.py
+    measures the per-request cost of requires_auth with and without the
+    verified-token cache, using a locally generated RS256 key and JWKS file
+    so no Auth0 tenant or network access is needed
+
+    python bench_auth.py --requests 2000
+'''
+
+import argparse
+import base64
+import json
+import os
+import tempfile
+import time
+
+import rsa
+from jose import jwt
+
+AUTH0_DOMAIN = 'rib-fsnd.eu.auth0.com'
+KID = 'bench-key'
+
+
+def b64_uint(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def make_token_and_jwks(permissions=('get:drinks-detail',)):
+    public, private = rsa.newkeys(2048)
+    jwks = {
+        'keys': [{
+            'kty': 'RSA',
+            'kid': KID,
+            'use': 'sig',
+            'alg': 'RS256',
+            'n': b64_uint(public.n),
+            'e': b64_uint(public.e)
+        }]
+    }
+    token = jwt.encode(
+        {
+            'iss': f'https://{AUTH0_DOMAIN}/',
+            'aud': 'coffeeapp',
+            'sub': 'bench|user',
+            'exp': int(time.time()) + 3600,
+            'permissions': list(permissions)
+        },
+        private.save_pkcs1().decode(),
+        algorithm='RS256',
+        headers={'kid': KID})
+    return token, jwks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time requires_auth with and without the token cache.')
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    token, jwks = make_token_and_jwks()
+    with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                     delete=False) as jwks_file:
+        json.dump(jwks, jwks_file)
+    os.environ['AUTH0_JWKS_URL'] = 'file://' + jwks_file.name
+
+    # Imported late so the auth module picks up the local JWKS URL.
+    from flask import Flask
+    from src.auth.auth import requires_auth, token_cache
+
+    @requires_auth('get:drinks-detail')
+    def view(payload):
+        return payload
+
+    app = Flask(__name__)
+    headers = {'Authorization': f'Bearer {token}'}
+    results = {}
+    for label, cache_size in (('without cache', 0), ('with cache', 1024)):
+        token_cache.clear()
+        token_cache.max_entries = cache_size
+        with app.test_request_context(headers=headers):
+            view()
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                view()
+            elapsed = time.perf_counter() - started
+        results[label] = elapsed / args.requests * 1e6
+
+    os.unlink(jwks_file.name)
+    for label, per_request in results.items():
+        print(f'{label:<15}{per_request:10.1f} us/request')
+    print(f'speedup        {results["without cache"] / results["with cache"]:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''
+bench_concurrency.py
+    drives the API with many threads against a throwaway SQLite database,
+    mixing menu reads with drink inserts, and reports throughput, latency
+    percentiles and failed requests ("database is locked" shows up as 422s
+    from the write handlers)
+
+    python bench_concurrency.py --threads 32 --requests 4000
+    python bench_concurrency.py --legacy    # without WAL and busy_timeout
+'''
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from bench_auth import make_token_and_jwks
+from src.database import engine, models
+
+RECIPE = [{'name': 'espresso', 'color': 'brown', 'parts': 1}]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load the API from many threads at once.')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--legacy', action='store_true',
+                        help='skip the SQLite pragmas from engine.py')
+    args = parser.parse_args()
+
+    if args.legacy:
+        event.remove(Engine, 'connect', engine.set_sqlite_pragmas)
+
+    token, jwks = make_token_and_jwks(
+        ['get:drinks-detail', 'post:drinks'])
+    with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                     delete=False) as jwks_file:
+        json.dump(jwks, jwks_file)
+    os.environ['AUTH0_JWKS_URL'] = 'file://' + jwks_file.name
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    # Must be set before src.api runs setup_db() on import.
+    models.database_path = 'sqlite:///' + path
+    from src.api import app
+    from src.database.models import db_drop_and_create_all
+
+    with app.app_context():
+        db_drop_and_create_all()
+
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def request(client, i):
+        if random.random() < args.write_ratio:
+            return client.post('/drinks?return=created', headers=headers,
+                               json={'title': f'drink {i}',
+                                     'recipe': RECIPE})
+        if i % 2:
+            return client.get('/drinks-detail', headers=headers)
+        return client.get('/drinks')
+
+    def worker(ids):
+        client = app.test_client()
+        timings, failures = [], 0
+        for i in ids:
+            started = time.perf_counter()
+            response = request(client, i)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures += 1
+        return timings, failures
+
+    chunks = [range(n, args.requests, args.threads)
+              for n in range(args.threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - started
+
+    for leftover in (path, path + '-wal', path + '-shm', jwks_file.name):
+        if os.path.exists(leftover):
+            os.unlink(leftover)
+
+    timings = sorted(t for chunk, _ in results for t in chunk)
+    failures = sum(f for _, f in results)
+    print(f'{"legacy" if args.legacy else "tuned"}: {args.requests} '
+          f'requests, {args.threads} threads, '
+          f'{args.write_ratio:.0%} writes')
+    print(f'throughput {len(timings) / elapsed:10.0f} req/s')
+    for label, q in (('p50', 0.5), ('p99', 0.99), ('max', 1.0)):
+        value = timings[min(int(q * len(timings)), len(timings) - 1)]
+        print(f'{label:<11}{value * 1000:10.1f} ms')
+    print(f'failed     {failures:10d}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+bench_menu.py
+    load test for GET /drinks against a throwaway SQLite database seeded
+    with a large menu, comparing
+        - uncached: the menu cache is bumped before every request
+        - cached: the encoded body is served from the menu cache
+        - revalidated: the client sends If-None-Match and gets 304s
+
+    python bench_menu.py --drinks 2000 --requests 500 --threads 8
+'''
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.database import models
+
+RECIPE = json.dumps([{
+    'name': 'espresso',
+    'color': 'brown',
+    'parts': 1
+}, {
+    'name': 'milk',
+    'color': 'white',
+    'parts': 3
+}])
+
+
+def run(client_factory, requests, threads, before_request=None, headers=None):
+
+    def worker(count):
+        client = client_factory()
+        for _ in range(count):
+            if before_request:
+                before_request()
+            response = client.get('/drinks', headers=headers)
+            assert response.status_code in (200, 304)
+
+    per_thread = [requests // threads] * threads
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, per_thread))
+    return sum(per_thread) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure /drinks throughput with the menu cache.')
+    parser.add_argument('--drinks', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    # Must be set before src.api runs setup_db() on import.
+    models.database_path = 'sqlite:///' + path
+    from src.api import app, menu_cache
+    from src.database.models import Drink, db, db_drop_and_create_all
+
+    with app.app_context():
+        db_drop_and_create_all()
+        db.session.bulk_save_objects([
+            Drink(title=f'drink {i}', recipe=RECIPE)
+            for i in range(args.drinks)
+        ])
+        db.session.commit()
+
+    etag = app.test_client().get('/drinks').headers['ETag']
+    results = {
+        'uncached':
+            run(app.test_client, args.requests, args.threads,
+                before_request=menu_cache.bump),
+        'cached':
+            run(app.test_client, args.requests, args.threads),
+        'revalidated (304)':
+            run(app.test_client, args.requests, args.threads,
+                headers={'If-None-Match': etag}),
+    }
+    os.unlink(path)
+
+    print(f'{args.drinks} drinks, {args.requests} requests, '
+          f'{args.threads} threads')
+    for label, rps in results.items():
+        print(f'{label:<20}{rps:10.0f} req/s'
+              f'{rps / results["uncached"]:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+'''
+check_jwks.py
+    checks that concurrent requests share one JWKS fetch: at cold start and
+    after a key rotation, every thread must wait for the fetch already in
+    flight and get the key, with a single call to the endpoint each time;
+    a slow stub stands in for Auth0 so no network access is needed
+
+    python check_jwks.py --threads 5 --delay 0.5
+'''
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.auth.auth import JWKSCache
+
+
+class StubJWKSCache(JWKSCache):
+
+    def __init__(self, delay):
+        super().__init__('stub://jwks', min_refresh=0.1)
+        self.delay = delay
+        self.kids = ['old']
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        time.sleep(self.delay)
+        return {'keys': [{'kid': kid} for kid in self.kids]}
+
+
+def get_concurrently(cache, kid, threads):
+    start = threading.Barrier(threads)
+
+    def get_key():
+        start.wait()
+        return cache.get_key(kid)
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(lambda _: get_key(), range(threads)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check that concurrent callers wait on one JWKS fetch.')
+    parser.add_argument('--threads', type=int, default=5)
+    parser.add_argument('--delay', type=float, default=0.5,
+                        help='seconds the stub endpoint takes to answer')
+    args = parser.parse_args()
+
+    cache = StubJWKSCache(args.delay)
+    failed = False
+    for label, kid in (('cold start', 'old'), ('key rotation', 'new')):
+        if kid == 'new':
+            # Rotations happen long after the last fetch.
+            time.sleep(cache.min_refresh)
+            cache.kids.append('new')
+        fetches = cache.fetches
+        keys = get_concurrently(cache, kid, args.threads)
+        found = sum(key is not None for key in keys)
+        fetched = cache.fetches - fetches
+        ok = found == args.threads and fetched == 1
+        failed = failed or not ok
+        print(f'{label:<15}{found}/{args.threads} keys, {fetched} fetch'
+              f'{"" if ok else "  FAILED"}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,32 +5,34 @@ from sqlalchemy import exc
 import json
 from flask_cors import CORS
 
-from .database.models import db_drop_and_create_all, setup_db, Drink
+from .database.models import db, db_drop_and_create_all, setup_db, Drink
 from .auth.auth import AuthError, requires_auth
+from .cache import ResponseCache
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+# Encoded /drinks and /drinks-detail bodies, bumped by every menu write.
+menu_cache = ResponseCache()
 
 # db_drop_and_create_all()
 
 
 ## ROUTES
+def encode_menu(view):
+    drinks = [getattr(d, view)() for d in Drink.query.all()]
+    return json.dumps({'success': True, 'drinks': drinks}).encode()
+
+
 @app.route('/drinks')
 def get_drinks():
-    drinks = Drink.query.all()
-    drinks = [d.short() for d in drinks]
-
-    return jsonify({'success': True, 'drinks': drinks}), 200
+    return menu_cache.respond('short', lambda: encode_menu('short'))
 
 
 @app.route('/drinks-detail')
 @requires_auth('get:drinks-detail')
 def get_drinks_detail(p):
-    drinks = Drink.query.all()
-    drinks = [d.long() for d in drinks]
-
-    return jsonify({'success': True, 'drinks': drinks}), 200
+    return menu_cache.respond('long', lambda: encode_menu('long'))
 
 
 @app.route('/drinks', methods=['POST'])
@@ -51,12 +53,56 @@ def create_drinks(p):
     except:
         print(sys.exc_info())
         abort(422)
+    menu_cache.bump()
+
+    # ?return=created skips re-serializing the whole menu after a write.
+    if request.args.get('return') == 'created':
+        return jsonify({'success': True, 'drinks': [drink.long()]}), 200
 
     drinks = [d.long() for d in Drink.query.all()]
 
     return jsonify({'success': True, 'drinks': drinks}), 200
 
 
+'''
+POST /drinks/bulk
+    takes {"drinks": [{"title": ..., "recipe": ...}, ...]}
+    inserts every drink in one transaction with a single commit
+    returns {"success": True, "created": <count>}, or 422 and inserts
+    nothing if any drink is invalid or a title already exists
+'''
+
+
+@app.route('/drinks/bulk', methods=['POST'])
+@requires_auth('post:drinks')
+def create_drinks_bulk(p):
+    res = request.get_json()
+
+    if not res or not isinstance(res.get('drinks'), list):
+        abort(422)
+
+    rows = []
+    for d in res['drinks']:
+        if not isinstance(d, dict) or not d.get('title'):
+            abort(422)
+        rows.append({
+            'title': d['title'],
+            'recipe': json.dumps(d.get('recipe', '{}'))
+        })
+
+    try:
+        if rows:
+            db.session.execute(Drink.__table__.insert(), rows)
+        db.session.commit()
+    except:
+        print(sys.exc_info())
+        db.session.rollback()
+        abort(422)
+    menu_cache.bump()
+
+    return jsonify({'success': True, 'created': len(rows)}), 200
+
+
 @app.route('/drinks/<int:drink_id>', methods=['PATCH'])
 @requires_auth('patch:drinks')
 def update_drinks(p, drink_id):
@@ -78,6 +124,7 @@ def update_drinks(p, drink_id):
     except:
         print(sys.exc_info())
         abort(422)
+    menu_cache.bump()
 
     return jsonify({'success': True, 'drinks': [d.long()]}), 200
 
@@ -109,6 +156,7 @@ def delete_drinks(p, drink_id):
     except:
         print(sys.exc_info())
         abort(422)
+    menu_cache.bump()
 
     return jsonify({'success': True, 'delete': d_id}), 200
 
@@ -1,4 +1,10 @@
+import hashlib
 import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from functools import wraps
 from urllib.request import urlopen
 
@@ -8,6 +14,12 @@ from jose import jwt
 AUTH0_DOMAIN = 'rib-fsnd.eu.auth0.com'
 ALGORITHMS = ['RS256']
 API_AUDIENCE = 'coffeeapp'
+# Point AUTH0_JWKS_URL at a file:// URL or a local stub server in tests.
+JWKS_URL = os.environ.get('AUTH0_JWKS_URL',
+                          f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+JWKS_TTL = int(os.environ.get('AUTH0_JWKS_TTL', 3600))
+# Number of verified tokens kept in memory, 0 disables the cache.
+TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 1024))
 
 ## AuthError Exception
 '''
@@ -23,6 +35,145 @@ class AuthError(Exception):
         self.status_code = status_code
 
 
+## JWKS Cache
+'''
+JWKSCache
+Signing keys fetched from the JWKS endpoint, kept for `ttl` seconds.
+    - keys close to expiry are refreshed by a background thread; if that
+      fails they keep being served, stale, while it is retried
+    - an unknown `kid` forces one refresh, in case the tenant rotated its
+      keys
+    - new fetches are started at most every `min_refresh` seconds whether
+      they succeed or not, so an unreachable endpoint is only waited on
+      once per interval
+    - callers needing a refresh while a fetch is running always wait on
+      that fetch instead of each hitting the endpoint or missing its keys
+'''
+
+
+class JWKSCache:
+
+    def __init__(self, url, ttl=3600, refresh_ahead=300, min_refresh=30,
+                 timeout=5):
+        self.url = url
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl / 2)
+        self.min_refresh = min_refresh
+        self.timeout = timeout
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._lock = threading.Lock()
+        self._inflight = None
+
+    def fetch(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def refresh(self):
+        with self._lock:
+            done = self._inflight
+            leader = done is None
+            if leader and not self.attempt_due():
+                return
+            if leader:
+                done = self._inflight = threading.Event()
+                self._last_attempt = time.monotonic()
+
+        if not leader:
+            done.wait(self.timeout)
+            return
+
+        try:
+            jwks = self.fetch()
+            keys = {key['kid']: key for key in jwks['keys']}
+            with self._lock:
+                self._keys = keys
+                self._fetched_at = time.monotonic()
+        except Exception:
+            # Keep serving the previous keys if the endpoint is unreachable.
+            print(sys.exc_info())
+            if not self._keys:
+                raise
+        finally:
+            with self._lock:
+                self._inflight = None
+            done.set()
+
+    def attempt_due(self):
+        return (self._last_attempt is None or
+                time.monotonic() - self._last_attempt >= self.min_refresh)
+
+    def refresh_in_background(self):
+        if self._inflight is None and self.attempt_due():
+            threading.Thread(target=self.refresh, daemon=True).start()
+
+    def get_key(self, kid):
+        if not self._keys:
+            # Nothing to serve yet, so the first fetch has to be waited on.
+            self.refresh()
+        elif time.monotonic() - self._fetched_at >= (self.ttl -
+                                                     self.refresh_ahead):
+            self.refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and self._keys:
+            self.refresh()
+            key = self._keys.get(kid)
+        return key
+
+
+jwks_cache = JWKSCache(JWKS_URL, JWKS_TTL)
+
+## Verified Token Cache
+'''
+TokenCache
+Tokens that already passed verify_decode_jwt, keyed by the SHA-256 digest
+of the token so raw tokens are never held in memory.
+Entries are dropped at the token's `exp` claim and evicted least recently
+used once `max_entries` is reached.
+'''
+
+
+class TokenCache:
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self.digest(token)
+        with self._lock:
+            verified = self._entries.get(key)
+            if verified is None:
+                return None
+            if verified.payload['exp'] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return verified
+
+    def set(self, token, verified):
+        if self.max_entries <= 0 or 'exp' not in verified.payload:
+            return
+        with self._lock:
+            self._entries[self.digest(token)] = verified
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+
 ## Auth Header
 def get_token_auth_header():
     auth = request.headers.get('Authorization', None)
@@ -59,19 +210,61 @@ def get_token_auth_header():
     return token
 
 
-def check_permissions(permission, payload):
+## Permissions
+'''
+VerifiedToken
+A verified payload together with its permissions as a frozenset, built once
+when the token is verified. `permissions` is None when the token carries no
+permissions claim.
+'''
+VerifiedToken = namedtuple('VerifiedToken', ['payload', 'permissions'])
+
+
+def permission_set(payload):
     if 'permissions' not in payload:
-        raise AuthError({'code': 400, 'description': 'Permissions not found'}, 400)
+        return None
+    return frozenset(payload['permissions'])
 
-    if permission not in payload['permissions']:
-        raise AuthError({'code': 401, 'description': 'Unauthorized Access'}, 401)
 
-    return True
+'''
+compile_permissions(all_of, any_of)
+    builds a check that passes when the token has every permission in
+    `all_of` and, if `any_of` is given, at least one of `any_of`
+    both are resolved to frozensets once, so a check is a subset and a
+    disjointness test regardless of how many permissions a role has
+'''
+
+
+def compile_permissions(all_of=(), any_of=()):
+    required = frozenset(all_of)
+    alternatives = frozenset(any_of)
+
+    def check(permissions):
+        if permissions is None:
+            raise AuthError(
+                {
+                    'code': 400,
+                    'description': 'Permissions not found'
+                }, 400)
+
+        if not required <= permissions or (
+                alternatives and alternatives.isdisjoint(permissions)):
+            raise AuthError(
+                {
+                    'code': 401,
+                    'description': 'Unauthorized Access'
+                }, 401)
+
+        return True
+
+    return check
+
+
+def check_permissions(permission, payload):
+    return compile_permissions(all_of=[permission])(permission_set(payload))
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
     unverified_header = jwt.get_unverified_header(token)
     rsa_key = {}
     if 'kid' not in unverified_header:
@@ -81,15 +274,15 @@ def verify_decode_jwt(token):
                 'description': 'Authorization malformed.'
             }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    key = jwks_cache.get_key(unverified_header['kid'])
+    if key:
+        rsa_key = {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }
     if rsa_key:
         try:
             payload = jwt.decode(token,
@@ -128,16 +321,39 @@ def verify_decode_jwt(token):
         }, 401)
 
 
-def requires_auth(permission=''):
+def get_verified_token(token):
+    verified = token_cache.get(token)
+    if verified is None:
+        payload = verify_decode_jwt(token)
+        verified = VerifiedToken(payload, permission_set(payload))
+        token_cache.set(token, verified)
+    return verified
+
+
+'''
+requires_auth(permission, all_of, any_of)
+    requires_auth('post:drinks')
+    requires_auth(all_of=['patch:drinks', 'post:drinks'])
+    requires_auth(any_of=['get:drinks-detail', 'patch:drinks'])
+    at least one permission is required; an empty requirement raises
+    ValueError when the route is decorated instead of admitting any token
+'''
+
+
+def requires_auth(permission='', all_of=(), any_of=()):
+    required = list(all_of) + ([permission] if permission else [])
+    if not required and not any_of:
+        raise ValueError('requires_auth needs at least one permission')
+    check = compile_permissions(all_of=required, any_of=any_of)
 
     def requires_auth_decorator(f):
 
         @wraps(f)
         def wrapper(*args, **kwargs):
             token = get_token_auth_header()
-            payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
-            return f(payload, *args, **kwargs)
+            verified = get_verified_token(token)
+            check(verified.permissions)
+            return f(verified.payload, *args, **kwargs)
 
         return wrapper
 
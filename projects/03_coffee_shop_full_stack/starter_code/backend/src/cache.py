@@ -0,0 +1,56 @@
+import hashlib
+import threading
+
+from flask import Response, request
+
+'''
+ResponseCache
+Keeps the encoded JSON body of each cached view together with an ETag,
+tagged with the cache version it was built under. bump() moves to a new
+version, so every stored body is rebuilt on its next request.
+    - the version is per process; each worker rebuilds its own copy after
+      its own writes and on restart
+    - the ETag is a digest of the body, so it is only reused while the
+      bytes are identical
+'''
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.version = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def get(self, key, build):
+        with self._lock:
+            version = self.version
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        body = build()
+        etag = hashlib.sha1(body).hexdigest()
+        entry = (body, etag)
+        with self._lock:
+            # A write landed while we were building; don't keep a stale body.
+            if version == self.version:
+                self._entries[key] = entry
+        return entry
+
+    '''
+    respond(key, build)
+        serves the cached body for key, building it with build() on a miss
+        returns 304 Not Modified when If-None-Match matches the ETag
+    '''
+
+    def respond(self, key, build):
+        body, etag = self.get(key, build)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(request)
@@ -1,8 +1,12 @@
 import os
-from sqlalchemy import Column, String, Integer
+from functools import lru_cache
+from sqlalchemy import Column, String, Integer, event
+from sqlalchemy.orm import validates
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from .engine import engine_options
+
 database_filename = "database.db"
 project_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = "sqlite:///{}".format(
@@ -18,6 +22,7 @@ setup_db(app)
 def setup_db(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
     db.app = app
     db.init_app(app)
 
@@ -35,6 +40,29 @@ def db_drop_and_create_all():
     db.create_all()
 
 
+'''
+decode_recipe(recipe)
+    parses a recipe JSON blob into (long form, short form)
+    cached by the blob itself, so each distinct recipe is decoded once per
+    process no matter how many requests or Drink instances serialize it
+    callers must treat the returned structures as read-only
+'''
+
+
+@lru_cache(maxsize=4096)
+def decode_recipe(recipe):
+    js = json.loads(recipe)
+
+    short_recipe = '{}'
+
+    if type(js) == list:
+        short_recipe = [{'color': r['color'], 'parts': r['parts']} for r in js]
+    elif type(js) == dict:
+        short_recipe = {'color': js['color'], 'parts': js['parts']}
+
+    return js, short_recipe
+
+
 '''
 Drink
 a persistent drink entity, extends the base SQLAlchemy Model
@@ -50,25 +78,33 @@ class Drink(db.Model):
     # the required datatype is [{'color': string, 'name':string, 'parts':number}]
     recipe = Column(String(180), nullable=False)
     '''
-    short()
-        short form representation of the Drink model
+    decoded_recipe()
+        (long form, short form) of the recipe, kept on the instance until
+        recipe is assigned or the instance is expired
     '''
 
-    def short(self):
-        js = json.loads(self.recipe)
-        print(js)
+    def decoded_recipe(self):
+        decoded = self.__dict__.get('_decoded_recipe')
+        if decoded is None:
+            decoded = self._decoded_recipe = decode_recipe(self.recipe)
+        return decoded
 
-        short_recipe = '{}'
+    @validates('recipe')
+    def reset_decoded_recipe(self, key, recipe):
+        self.__dict__.pop('_decoded_recipe', None)
+        return recipe
 
-        if type(js) == list:
-            short_recipe = [{
-                'color': r['color'],
-                'parts': r['parts']
-            } for r in json.loads(self.recipe)]
-        elif type(js) == dict:
-            short_recipe = {'color': js['color'], 'parts': js['parts']}
+    '''
+    short()
+        short form representation of the Drink model
+    '''
 
-        return {'id': self.id, 'title': self.title, 'recipe': short_recipe}
+    def short(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'recipe': self.decoded_recipe()[1]
+        }
 
     '''
     long()
@@ -79,7 +115,7 @@ class Drink(db.Model):
         return {
             'id': self.id,
             'title': self.title,
-            'recipe': json.loads(self.recipe)
+            'recipe': self.decoded_recipe()[0]
         }
 
     '''
@@ -123,4 +159,10 @@ class Drink(db.Model):
         db.session.commit()
 
     def __repr__(self):
-        return json.dumps(self.short())
\ No newline at end of file
+        return json.dumps(self.short())
+
+
+@event.listens_for(Drink, 'expire')
+def reset_expired_recipe(drink, attrs):
+    if attrs is None or 'recipe' in attrs:
+        drink.__dict__.pop('_decoded_recipe', None)
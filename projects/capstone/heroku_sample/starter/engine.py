@@ -0,0 +1,56 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+
+'''
+Engine settings, tunable through the environment
+    DB_POOL_SIZE            connections kept open per process
+    DB_MAX_OVERFLOW         extra connections allowed under load
+    DB_POOL_TIMEOUT         seconds to wait for a free connection
+    DB_POOL_RECYCLE         seconds before a connection is replaced
+    DB_STATEMENT_TIMEOUT    Postgres statement timeout in milliseconds
+    SQLITE_BUSY_TIMEOUT     milliseconds SQLite waits on a locked database
+This is a copy of projects/01_fyyur/starter_code/engine.py, which explains
+each setting. The projects are deployed separately and cannot import from
+one another, so the copies are kept in sync by hand.
+'''
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+STATEMENT_TIMEOUT = int(os.environ.get('DB_STATEMENT_TIMEOUT', 30000))
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 30000))
+
+
+def engine_options(database_path):
+    if database_path.startswith('sqlite'):
+        return {}
+
+    options = {
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
+    if database_path.startswith('postgres'):
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={STATEMENT_TIMEOUT}'
+        }
+    if make_url(database_path).get_driver_name() == 'psycopg2':
+        options['executemany_mode'] = 'values'
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()